@@ -1,20 +1,19 @@
 # main.py
 
 import os
-import asyncio
-import schedule
+import sys
 import time
-import csv
+import asyncio
+import functools
 from dotenv import load_dotenv
 from datetime import datetime
-from atproto.exceptions import AtProtocolError
 import calendar
-from content_generators.bluesky_generation_agent import TweetGenerationAgent
-from content_generators.bluesky_comment_analysis_agent import CommentAnalysisAgent
-from content_generators.story_phase_manager import StoryPhaseManager
-from content_generators.story_summary import generate_story_summary
+from content_generators.job_budget import JobBudget
 import logging
 
+# langchain, atproto and the agents are imported lazily by the getters below, so importing
+# this module stays cheap and no model client or Bluesky session is built until the job needs it.
+
 # Load environment variables
 load_dotenv()
 try:
@@ -37,98 +36,205 @@ logging.basicConfig(
     format='%(asctime)s:%(levelname)s:%(message)s'
 )
 
-# Initialize Agents
 openai_api_key = os.getenv("OPENAI_API_KEY")
 anthropic_api_key = os.getenv("ANTHROPIC_API_KEY")
-tweet_agent = TweetGenerationAgent(openai_api_key, anthropic_api_key)
-comment_agent = CommentAnalysisAgent(openai_api_key)
-phase_manager = StoryPhaseManager()
 
-# Reward threshold for logging top examples
-REWARD_THRESHOLD = 10  # Example threshold
+# Stories to run, each with its own account, prompts, cadence and data directory
+STORIES_PATH = os.getenv("STORIES_PATH", "config/stories.json")
 
-def log_tweet(timestamp, post_uri, tweet, likes, retweets, comments, reward):
-    try:
-        # Ensure the logs directory exists
-        os.makedirs(log_dir, exist_ok=True)
-        # Check if the CSV file exists; if not, write headers
-        file_exists = os.path.isfile(os.path.join(log_dir, 'tweet_logs.csv'))
-        with open(os.path.join(log_dir, 'tweet_logs.csv'), mode='a', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            if not file_exists:
-                writer.writerow(['Timestamp', 'URI', 'Tweet', 'Likes', 'Retweets', 'Comments', 'Reward'])
-        # Log the tweet data
-        writer.writerow([timestamp, post_uri, tweet, likes, retweets, comments, reward])
-    except Exception as e:
-        logging.error(f"Failed to log tweet: {e}")
-
-def update_top_examples(tweet, reward):
-    if reward >= REWARD_THRESHOLD:
-        try:
-            os.makedirs('logs', exist_ok=True)
-            with open('logs/top_examples.txt', 'a', encoding='utf-8') as f:
-                f.write(f"{tweet}\n")
-            print("Added post to top examples.")
-        except Exception as e:
-            logging.error(f"Error updating top examples: {e}")
-            print(f"Error updating top examples: {e}")
-
-def is_content_safe(tweet):
-    safety_prompt = (
-        f"Is the following post appropriate for an adult audience and free from offensive or controversial content? "
-        f"Respond with 'Yes' or 'No'.\n\nPost: \"{tweet}\""
-    )
+@functools.lru_cache(maxsize=None)
+def get_provider_pool():
+    from content_generators.story_runtime import ProviderPool
+    # Model clients, the LLM cache and provider limits are shared by every story
+    return ProviderPool(openai_api_key, anthropic_api_key)
+
+@functools.lru_cache(maxsize=None)
+def get_metrics_store():
+    from content_generators.metrics_store import MetricsStore
+    # One store for every story; rows carry the story name
+    return MetricsStore(os.path.join(log_dir, 'metrics.sqlite3'))
+
+@functools.lru_cache(maxsize=None)
+def get_stories():
+    from content_generators.story_runtime import StoryRuntime, load_story_configs
+    return [StoryRuntime(config, get_provider_pool(), default_post_time=POST_TIME)
+            for config in load_story_configs(STORIES_PATH)]
+
+# Daily posting time (local, HH:MM) and background cadence for daemon mode
+POST_TIME = os.getenv("POST_TIME", "09:00")
+COMMENT_INGEST_INTERVAL = 3 * 3600
+METRICS_MAX_SLEEP = 3600
+
+# End-to-end deadline for one story's daily job (seconds), and how many of the
+# most-liked comments are still screened once the budget runs low
+JOB_BUDGET = float(os.getenv("JOB_BUDGET", 240))
+DEGRADED_COMMENT_LIMIT = 10
+
+# Minutes before each story's post time the daemon prepares its next post; 0 turns this off
+PREGENERATION_LEAD = int(os.getenv("PREGENERATION_LEAD", 30))
+
+def calculate_reward(likes, retweets, comments):
+    return (likes * 1) + (retweets * 2) + (comments * 0.5)
+
+def record_engagement(story, snapshots):
+    """
+    Stores a batch of engagement checkpoints (1h, 6h or 24h after posting) with their rewards.
+    """
+    for snapshot in snapshots:
+        snapshot['reward'] = calculate_reward(snapshot['likes'], snapshot['reposts'], snapshot['replies'])
+    get_metrics_store().add_snapshots(snapshots, story=story.name)
+
+    # Only the final checkpoint decides whether a post is an exemplar
+    final_checkpoint = story.engagement_scheduler.checkpoints[-1][0]
+    exemplars = story.tweet_agent.exemplars
+    changed = False
+    for snapshot in snapshots:
+        if snapshot['checkpoint'] == final_checkpoint:
+            changed |= exemplars.update(snapshot.get('phase'), snapshot['uri'], snapshot['text'], snapshot['reward'])
+    if changed:
+        exemplars.save()
+
+async def measure_engagement(story):
+    """
+    Resolves every engagement checkpoint of a story that has come due, in bulk.
+    """
     try:
-        # For ChatOpenAI, we need to pass a messages list
-        messages = [{"role": "user", "content": safety_prompt}]
-        response = tweet_agent.reviewer.invoke(messages)
-        return "yes" in response.content.lower()
+        async with story.engagement_lock:
+            snapshots = []
+            taken = await story.engagement_scheduler.run_due(snapshots.append)
+            # One transaction for the whole batch
+            record_engagement(story, snapshots)
+        logging.info(f"[{story.name}] Recorded {taken} engagement snapshots.")
     except Exception as e:
-        logging.error(f"Error checking content safety: {e}")
-        return False
+        logging.error(f"[{story.name}] Error measuring engagement: {e}")
 
-def analyze_comment(comment):
-    return comment_agent.analyze_comment(comment)
+async def is_content_safe(story, tweet):
+    return await story.tweet_agent.check_safety(tweet)
 
-def select_valid_comment(comments):
+# Comment blocks screened concurrently, highest-liked first
+SCREENING_CONCURRENCY = 4
+
+async def select_valid_comment(story, comments, post_text=None):
     if not comments:
         return None
-    # Sort comments by like count descending
-    sorted_comments = sorted(comments, key=lambda x: x['likes'], reverse=True)
-    
-    # Iterate through the sorted comments until a valid one is found
-    for comment in sorted_comments:
-        if analyze_comment(comment['text']):
-            return comment['text']
-    
-    # If no valid comment is found, return None
-    return None
-
-def post_tweet(tweet):
-    return tweet_agent.post_tweet(tweet)
-
-def fetch_metrics(post_uri):
-    try:
-        post = tweet_agent.client.get_post(post_uri)
-        likes = post.get('like_count', 0)
-        retweets = post.get('repost_count', 0)
-        comments = comment_agent.fetch_comments(post_uri)
-        return likes, retweets, comments
-    except AtProtocolError as e:
-        logging.error(f"Error fetching metrics for post {post_uri}: {e}")
-        return 0, 0, []
-
-async def job():
+    # Collapse near-duplicates, rank groups by summed likes and screen them in parallel blocks;
+    # the highest-ranked valid one wins
+    return await story.comment_agent.aselect_comment(comments, max_concurrency=SCREENING_CONCURRENCY,
+                                                     post_text=post_text)
+
+def post_tweet(story, tweet):
+    return story.tweet_agent.post_tweet(tweet)
+
+async def read_story(story, budget):
+    """
+    The month's posts so far (announcements left out), the id of the latest one,
+    and the story context for the prompt. Also indexes the posts and folds the
+    latest one into the rolling summary.
+    """
+    tweet_agent = story.tweet_agent
+    # Served from the local ledger if the feed sync runs over
+    recent_posts, last_post_id = await budget.run("feed", asyncio.to_thread(tweet_agent.fetch_recent_posts),
+                                                  fallback=tweet_agent.ledger.current_story)
+
+    # Remove any string that starts with "Welcome to a new month"
+    recent_posts = [post for post in recent_posts if not post.startswith("Welcome to a new month")]
+
+    # Index the month's posts for callbacks and continuity checks
+    tweet_agent.track_story(recent_posts)
+
+    # Fold yesterday's post into the month's rolling summary
+    await budget.run("summary", tweet_agent.update_story_summary(recent_posts))
+
+    # Fit the month's posts into the generation token budget, keeping the latest ones verbatim
+    all_posts = tweet_agent.build_story_context(recent_posts)
+    return recent_posts, last_post_id, all_posts
+
+async def leading_comment(story, budget, last_post_id, recent_posts):
+    """
+    The highest-ranked valid comment on the latest post, or None.
+    """
+    # Fetch comments on the last post
+    comments = await budget.run("comments",
+                                asyncio.to_thread(story.comment_agent.fetch_comments, last_post_id),
+                                fallback=list)
+    if budget.degrade("fewer_comments"):
+        comments = sorted(comments, key=lambda x: x['likes'] or 0, reverse=True)[:DEGRADED_COMMENT_LIMIT]
+    # Select the most valid comment
+    return await budget.run("screening", select_valid_comment(story, comments, post_text=recent_posts[-1]))
+
+async def pregenerate(story):
+    """
+    Prepares a story's next post ahead of its slot: one continuation without a
+    comment and, if there is a valid comment, one following the leading comment.
+    Both are safety-checked and stored, so at post time the job only has to
+    confirm the leading comment is still the same.
+    """
+    from content_generators.bluesky_generation_agent import GENERATION_FAILED
+    await story.prepare()
+    budget = JobBudget(total=JOB_BUDGET)
+    tweet_agent = story.tweet_agent
+    phase = story.phase_manager.get_current_phase()
+    if phase == "exposition" and datetime.now().day == 1:
+        # The first post of the month is written at post time
+        return
+
+    recent_posts, last_post_id, all_posts = await read_story(story, budget)
+    if not recent_posts or not last_post_id:
+        return
+    valid_comment = await leading_comment(story, budget, last_post_id, recent_posts)
+
+    branches = {'none': None}
+    if valid_comment:
+        branches['comment'] = valid_comment
+
+    async def prepare_branch(user_comment):
+        callbacks = tweet_agent.find_callbacks(recent_posts, user_comment)
+        text = await tweet_agent.generate_competing_tweets(last_tweet=all_posts, user_comment=user_comment,
+                                                           callbacks=callbacks)
+        if text == GENERATION_FAILED or text in tweet_agent.rejected:
+            return text, None
+        approval = tweet_agent.approved.get(text)
+        if approval is None and await tweet_agent.check_safety(text):
+            approval = "passed the safety check ahead of the slot"
+        return text, approval
+
+    results = await asyncio.gather(*(prepare_branch(comment) for comment in branches.values()))
+    # Posts that failed generation or the safety check are written again at post time
+    posts = {branch: (text, approval) for branch, (text, approval) in zip(branches, results)
+             if approval is not None}
+    story.pregenerated.put(last_post_id, phase, valid_comment, posts)
+    logging.info(f"[{story.name}] Prepared {len(posts)} of {len(branches)} posts for the next slot.")
+
+async def story_job(story, dry_run=False):
+    """
+    Runs one day of a single story. With `dry_run`, everything runs except posting.
+    Network calls of the synchronous Bluesky client run in worker threads, so
+    the jobs of all stories can share one event loop. Stages run under a
+    JobBudget and degrade (fewer comments, one provider, no reviewer) when it
+    runs low; the safety check always runs.
+    """
+    from content_generators.bluesky_generation_agent import GENERATION_FAILED
+    await story.prepare()
+    budget = JobBudget(total=JOB_BUDGET)
+    tweet_agent = story.tweet_agent
+    # Reviewer verdicts only count for posts generated in this run
+    tweet_agent.approved.clear()
+    tweet_agent.rejected.clear()
     today = datetime.now()
-    phase = phase_manager.get_current_phase()
+    phase = story.phase_manager.get_current_phase()
     day = today.day
     month = today.month
     year = today.year
     total_days = calendar.monthrange(year, month)[1]
 
-    logging.info(f"Today is day {day} of the month out of {total_days} days. Phase: {phase}")
+    logging.info(f"[{story.name}] Today is day {day} of the month out of {total_days} days. Phase: {phase}")
+
+    # Measure earlier posts in the background; this never holds up today's post
+    metrics_task = None if dry_run else asyncio.create_task(measure_engagement(story))
 
     tweets_to_post = []
+    # New-month and closing announcements; they are not story beats, so they get no phase
+    announcements = set()
 
     if phase == "exposition" and day == 1:
         # Generate and post the first introduction tweet
@@ -139,21 +245,17 @@ async def job():
             f"Let's embark on this adventure together! 🚀 #InteractiveStory"
         )
         tweets_to_post.append(intro_tweet)
+        announcements.add(intro_tweet)
         
         # Generate the first story tweet
         # first_story_tweet = tweet_agent.generate_tweet(last_tweet=None, user_comment=None)
         first_story_tweet = await tweet_agent.generate_competing_tweets(last_tweet=None,
-                                                                        user_comment=None)
+                                                                        user_comment=None,
+                                                                        budget=budget)
         tweets_to_post.append(first_story_tweet)
     else:
         # Continue the storyline based on engagement and phase
-        recent_posts, last_post_id = tweet_agent.fetch_recent_posts()
-
-        # Remove any string that starts with "Welcome to a new month"
-        recent_posts = [post for post in recent_posts if not post.startswith("Welcome to a new month")]
-        
-        # Join the list of strings in recent_posts by a space
-        all_posts = " ".join(recent_posts)
+        recent_posts, last_post_id, all_posts = await read_story(story, budget)
 
         if len(recent_posts) == 0:
             # If no previous post exists, start exposition
@@ -163,28 +265,39 @@ async def job():
                 f"Welcome to a new month of our interactive story! 📖✨ "
                 f"This month's tale is yet unwritten, and it's up to you to shape its journey. "
                 f"For the next {days_remaining} days, your comments will help determine the plot twists and turns. "
-                f"Let's embark on this adventure together! 🚀 #CollectiveLore"
+                f"Let's embark on this adventure together! 🚀 {story.hashtag}"
             )
             tweets_to_post.append(intro_tweet)
+            announcements.add(intro_tweet)
             # next_post = tweet_agent.generate_tweet(last_tweet=None, user_comment=None)
             next_post = await tweet_agent.generate_competing_tweets(last_tweet=None,
-                                                                    user_comment=None)
+                                                                    user_comment=None,
+                                                                    budget=budget)
             tweets_to_post.append(next_post)
         else:
             try:
-                # Fetch comments on the last post
-                comments = comment_agent.fetch_comments(last_post_id)
-                # Select the most valid comment
-                valid_comment = select_valid_comment(comments)
-                if valid_comment:
+                valid_comment = await leading_comment(story, budget, last_post_id, recent_posts)
+                # A post prepared ahead of the slot is used as long as the leading comment hasn't changed
+                prepared = story.pregenerated.take(last_post_id, phase, valid_comment, keep=dry_run)
+                # Earlier beats relevant to where the story is and where the comment takes it
+                callbacks = None if prepared else tweet_agent.find_callbacks(recent_posts, valid_comment)
+                if prepared:
+                    next_post, approval = prepared
+                    tweet_agent.approved[next_post] = approval
+                    tweets_to_post.append(next_post)
+                elif valid_comment:
                     # next_post = tweet_agent.generate_tweet(last_tweet=all_posts, user_comment=valid_comment)
                     next_post = await tweet_agent.generate_competing_tweets(last_tweet=all_posts,
-                                                                            user_comment=valid_comment)
+                                                                            user_comment=valid_comment,
+                                                                            budget=budget,
+                                                                            callbacks=callbacks)
                     tweets_to_post.append(next_post)
                 else:
                     # next_post = tweet_agent.generate_tweet(last_tweet=all_posts, user_comment=None)
                     next_post = await tweet_agent.generate_competing_tweets(last_tweet=all_posts,
-                                                                            user_comment=None)
+                                                                            user_comment=None,
+                                                                            budget=budget,
+                                                                            callbacks=callbacks)
                     tweets_to_post.append(next_post)
             except Exception as e:
                 logging.error(f"Error fetching comments: {e}")
@@ -193,37 +306,106 @@ async def job():
         resolution_tweet = (
             f"And so concludes our story for {month}. 🏁✨ "
             f"Thank you all for your incredible contributions and engagement throughout the month. "
-            f"Stay tuned for next month's adventure! 📚🚀 #CollectiveLore"
+            f"Stay tuned for next month's adventure! 📚🚀 {story.hashtag}"
         )
         tweets_to_post.append(resolution_tweet)
+        announcements.add(resolution_tweet)
 
-    print('printing tweets to post')
+    print(f'printing tweets to post for {story.name}')
     print(tweets_to_post)
 
     for post in tweets_to_post:
+        if post == GENERATION_FAILED:
+            # Every generation failed or ran out of time; skip the day's beat rather than post the error
+            budget.record("generation_failed")
+            continue
+
         # Ensure the post is safe
-        safe = is_content_safe(post)
+        # The reviewer (or the check started during generation) already passed the post it picked,
+        # and a post the reviewer flagged is never posted; everything else is checked here.
+        # Never skipped; a check that runs over counts as unsafe
+        if post in tweet_agent.rejected:
+            safe = False
+        elif post in tweet_agent.approved:
+            safe = True
+        else:
+            safe = await budget.run("safety", is_content_safe(story, post), fallback=False)
         if not safe:
             logging.info("Generated post failed content safety check. Skipping.")
+            if dry_run:
+                print("Generated post failed content safety check. Skipping.")
             continue
 
-        # Post the tweet and collect metrics
-        post_id, post_uri = post_tweet(post)
-        if not post_uri:
+        if dry_run:
+            print(f"Dry run, not posting: {post}")
             continue
 
-        # Fetch metrics
-        # likes, retweets, comments_fetched = fetch_metrics(post_id)
+        # Post the tweet and queue its engagement checkpoints.
+        # A post that runs over its allowance is not retried; it may still land, but goes unmeasured
+        posted = await budget.run("post", asyncio.to_thread(post_tweet, story, post))
+        if not posted or not posted[1]:
+            continue
+        post_id, post_uri = posted
+        post_phase = None if post in announcements else phase
+        story.engagement_scheduler.schedule(post_uri, post, phase=post_phase)
+        get_metrics_store().add_post(post_uri, post, phase=post_phase, story=story.name)
+
+    # Keep a record of how long each stage took and which degradations fired
+    budget.save(os.path.join(story.data_dir, 'job_budget.jsonl'))
+
+    if metrics_task:
+        await metrics_task
 
-        # Calculate reward
-        # reward = calculate_reward(likes, retweets, len(comments_fetched))
+async def job(dry_run=False):
+    """
+    Runs one day of every configured story, concurrently on this event loop.
+    With `dry_run`, everything runs except posting (this is what bluesky_check.py does).
+    """
+    stories = get_stories()
+    results = await asyncio.gather(*(story_job(story, dry_run=dry_run) for story in stories),
+                                   return_exceptions=True)
+    for story, result in zip(stories, results):
+        # A failing story must not take the others down with it
+        if isinstance(result, Exception):
+            logging.error(f"[{story.name}] Error running daily job: {result}")
 
-        # Log the post
-        # timestamp = datetime.now().isoformat()
-        # log_tweet(timestamp, post_uri, post, likes, retweets, len(comments_fetched), reward)
+async def ingest_comments(story):
+    """
+    Screens the replies to a story's latest post ahead of its daily job, so their
+    verdicts are already cached when the job needs them.
+    """
+    await story.prepare()
+    recent_posts, last_post_id = await asyncio.to_thread(story.tweet_agent.fetch_recent_posts)
+    if not last_post_id:
+        return
+    comments = await asyncio.to_thread(story.comment_agent.fetch_comments, last_post_id)
+    await select_valid_comment(story, comments, post_text=recent_posts[-1])
 
-        # Update top examples if necessary
-        # update_top_examples(post, reward)
+def seconds_until_metrics_due(story):
+    next_due = story.engagement_scheduler.next_due_at()
+    if next_due is None:
+        return METRICS_MAX_SLEEP
+    return min(max(next_due - time.time(), 0), METRICS_MAX_SLEEP)
+
+async def run_daemon():
+    """
+    Keeps one process resident for every story: each story's daily job at its own
+    post time (with its post prepared `PREGENERATION_LEAD` minutes earlier),
+    engagement checkpoints as they come due, and comment ingestion every few hours.
+    """
+    from content_generators.daemon import DailyDaemon, shift_time
+    daemon = DailyDaemon()
+    for story in get_stories():
+        daemon.add_daily(functools.partial(story_job, story), story.post_time)
+        if PREGENERATION_LEAD > 0:
+            daemon.add_daily(functools.partial(pregenerate, story), shift_time(story.post_time, -PREGENERATION_LEAD))
+        daemon.add_background(functools.partial(measure_engagement, story),
+                              functools.partial(seconds_until_metrics_due, story))
+        daemon.add_background(functools.partial(ingest_comments, story), lambda: COMMENT_INGEST_INTERVAL)
+    await daemon.run()
 
 if __name__ == "__main__":
-    asyncio.run(job())  # Run the job immediately
+    if "--daemon" in sys.argv[1:]:
+        asyncio.run(run_daemon())
+    else:
+        asyncio.run(job())  # Run the job immediately
@@ -1,127 +1,199 @@
 # content_generators/comment_analysis_agent.py
 
-from atproto import Client
 from atproto.exceptions import AtProtocolError
-from langchain.chains import LLMChain
-from langchain.prompts import PromptTemplate
 from langchain_openai import OpenAI
-from langchain_core.runnables import RunnableSequence, RunnableMap
+from .story_context import count_tokens
+from .comment_screener import first_in_rank
+from .comment_prefilter import CommentPrefilter
+from .comment_dedup import SimHashIndex, group_comments
+from .bluesky_session import get_shared_client
+from .reply_walker import iter_replies
+from .rate_limiter import guarded_ainvoke
 import os
+import re
+import json
 import logging
 
+def build_comment_model(openai_api_key, llm_cache=None):
+    """
+    Builds the completion model that classifies comments.
+    """
+    # Retries are left to the shared OpenAI guard in rate_limiter
+    return OpenAI(api_key=openai_api_key, temperature=0, cache=llm_cache, max_retries=0)
+
 class CommentAnalysisAgent:
-    def __init__(self, openai_api_key):
-        self.llm = OpenAI(api_key=openai_api_key)
-        self.client = Client()
+    def __init__(self, openai_api_key, llm_cache=None, batch_size=10, batch_token_budget=2000, client=None,
+                 reply_depth=1, llm=None, data_dir='logs'):
+        # Checks are deterministic so the same comments are only ever analyzed once.
+        # Pass `llm` to share one classifier between stories (see build_comment_model).
+        self.llm = llm or build_comment_model(openai_api_key, llm_cache)
+        # Comments per classification call, bounded by count and by prompt tokens.
+        # Smaller blocks let more of them be screened in parallel.
+        self.batch_size = batch_size
+        self.batch_token_budget = batch_token_budget
+        # Rejects emoji-only, praise, link-only and copied replies without a model call
+        self.prefilter = CommentPrefilter(stats_path=os.path.join(data_dir, 'prefilter_stats.json'))
+        # Verdicts of near-duplicate comments screened on earlier days
+        self.dedup_index = SimHashIndex(path=os.path.join(data_dir, 'comment_simhash.json'))
+        # Shares one persisted Bluesky session with the generation agent
+        self.client = client or get_shared_client()
         self.handle = os.getenv("BLUESKY_HANDLE")
-        self.password = os.getenv("BLUESKY_PASSWORD")
         self.base_url = "https://bsky.app"  # Replace with actual Bluesky base URL if different
+        # How many levels of replies count as comments (1 = direct replies only)
+        self.reply_depth = reply_depth
 
-        try:
-            # Authenticate with Bluesky
-            self.client.login(self.handle, self.password)
-            print("Successfully authenticated with Bluesky.")
-        except AtProtocolError as e:
-            logging.error(f"AT Protocol Error during authentication: {e}")
-            print(f"AT Protocol Error during authentication: {e}")
-        except Exception as e:
-            logging.error(f"Unexpected error during authentication: {e}")
-            print(f"Unexpected error during authentication: {e}")
+    def chunk_comments(self, indexed_texts):
+        """
+        Splits (index, text) pairs into numbered blocks that fit the classifier's context window.
+        Yields lists of (index, text) pairs.
+        """
+        chunk = []
+        chunk_tokens = 0
+        for index, text in indexed_texts:
+            text = " ".join(text.split())
+            tokens = count_tokens(text) + 4
+            if chunk and (chunk_tokens + tokens > self.batch_token_budget or len(chunk) >= self.batch_size):
+                yield chunk
+                chunk = []
+                chunk_tokens = 0
+            chunk.append((index, text))
+            chunk_tokens += tokens
+        if chunk:
+            yield chunk
+
+    def build_batch_prompt(self, chunk):
+        numbered = "\n".join(f"{number}. \"{text}\"" for number, (_, text) in enumerate(chunk, start=1))
+        return (
+            f"You are screening replies to a serialized Bluesky story. For each numbered comment below decide two things.\n"
+            f"ethical: false only if the comment contains hate speech, explicit content, or promotes violence. "
+            f"Allow for creative freedom, including romance and dark story elements such as danger or characters being killed off.\n"
+            f"relevant: true if the comment introduces a new direction, new characters, or new plot developments, including imaginative "
+            f"or unconventional ideas like fantasy, scifi, romance or other book genre elements; false if it is a general reaction "
+            f"(e.g., praise, feedback) or does not contribute to advancing the storyline.\n\n"
+            f"Comments:\n{numbered}\n\n"
+            f"Respond with only a JSON array with one object per comment, e.g. "
+            f"[{{\"id\": 1, \"ethical\": true, \"relevant\": false}}]\n"
+        )
 
-    def analyze_comment(self, comment_text):
+    def parse_batch_response(self, chunk, response):
+        """
+        Returns a dict of comment index -> {'ethical': bool, 'relevant': bool};
+        comments without a verdict are missing from it.
+        Each verdict object is parsed on its own, so a reply that is cut off or
+        malformed part-way only loses the verdicts it didn't finish.
+        """
+        logging.debug(f"Batch comment classification: {response}")
+        verdicts = {}
+        for match in re.finditer(r'\{[^{}]*\}', response):
+            try:
+                item = json.loads(match.group(0))
+            except ValueError:
+                continue
+            number = item.get('id')
+            if isinstance(number, int) and 1 <= number <= len(chunk):
+                verdicts[chunk[number - 1][0]] = {
+                    'ethical': item.get('ethical') is True,
+                    'relevant': item.get('relevant') is True,
+                }
+        return verdicts
+
+    async def aclassify_chunk(self, chunk, retry_missing=True):
+        """
+        Classifies a block of comments in a single completion. Comments the reply
+        has no verdict for are sent again once, as a smaller block of their own.
+        """
         try:
-            # Check ethical and moral positivity
-            ethical_prompt = (
-            f"Analyze the following comment and determine if it is ethically and morally suitable for guiding a story. "
-            f"Allow for creative freedom, including romance and dark story elements such as danger or characters being killed off, "
-            f"but ensure the content avoids hate speech, explicit material, or anything that would be considered R-rated. "
-            f"Only respond with 'No' if the comment contains hate speech, explicit content, or promotes violence. "
-            f"Otherwise, respond with 'Yes' to allow the comment.\n\nComment: \"{comment_text}\""
-            )
-
-            ethical_template = PromptTemplate(
-                input_variables=[],
-                template=ethical_prompt
-            )
-
-            # Initialize the LLMChain
-            chain = LLMChain(llm=self.llm, prompt=ethical_template, verbose=True)
-            
-            # Run the chain to generate the tweet
-            ethical_response = chain.invoke(input={})
-            logging.debug(f"Generated to see if response is ethical: {ethical_response}")
-            if isinstance(ethical_response, dict) and 'text' in ethical_response:
-                is_ethical = ethical_response['text'].strip().lower() == 'yes'
-
-            # Check relevance to story guidance
-            relevance_prompt = (
-            f"Determine if the following comment is intended to guide the storyline of a serialized Bluesky story. "
-            f"Respond with 'Yes' if the comment introduces a new direction, new characters, or new plot developments, including imaginative or unconventional ideas like fantasy, scifi, romance or other book genre elements. "
-            f"Respond with 'No' if the comment is a general reaction (e.g., praise, feedback) or does not contribute to advancing the storyline.\n\n"
-            f"Comment: \"{comment_text}\""
-            )
-            relevance_template = PromptTemplate(
-                input_variables=[],
-                template=relevance_prompt
-            )
-
-            # Initialize the LLMChain
-            chain = LLMChain(llm=self.llm, prompt=relevance_template, verbose=True)
-
-            
-            # Run the chain to generate the tweet
-            relevance_response = chain.invoke(input={})
-            logging.debug(f"Generated to see if response is relevant: {relevance_response}")
-            if isinstance(relevance_response, dict) and 'text' in relevance_response:
-                is_relevant = relevance_response['text'].strip().lower() == 'yes'
-
-            return is_ethical and is_relevant
-        
+            # About 20 tokens per compact verdict; the rest is headroom for wordier replies
+            response = await guarded_ainvoke("openai", self.llm, self.build_batch_prompt(chunk),
+                                             max_tokens=30 * len(chunk) + 20)
+            verdicts = self.parse_batch_response(chunk, response)
         except Exception as e:
-            logging.error(f"Error analyzing comment: {e}")
-            print(f"Error analyzing comment: {e}")
-            return False
+            logging.error(f"Error analyzing comments: {e}")
+            print(f"Error analyzing comments: {e}")
+            return {}
+
+        missing = [(index, text) for index, text in chunk if index not in verdicts]
+        if missing and retry_missing:
+            logging.error(f"Missing verdicts for {len(missing)} comments; classifying them again.")
+            verdicts.update(await self.aclassify_chunk(missing, retry_missing=False))
+        elif missing:
+            logging.error(f"Missing verdicts for {len(missing)} comments; treating them as invalid.")
+        return verdicts
+
+    async def aselect_first_valid(self, comment_texts, max_concurrency=4, post_text=None, on_verdict=None):
+        """
+        Returns the first comment (in the given ranking) that is both ethical and relevant.
+        Comments rejected by the prefilter never reach the model; the rest are
+        classified in numbered blocks, up to `max_concurrency` at once, and
+        lower-ranked blocks are cancelled once a higher-ranked one has decided.
+        `on_verdict(index, valid)` is called for every comment the model classified
+        or the prefilter rejected.
+        """
+        async def first_valid_in_chunk(chunk):
+            chunk_verdicts = await self.aclassify_chunk(chunk)
+            if on_verdict:
+                for index, verdict in chunk_verdicts.items():
+                    on_verdict(index, verdict['ethical'] and verdict['relevant'])
+            for index, _ in chunk:
+                verdict = chunk_verdicts.get(index)
+                if verdict and verdict['ethical'] and verdict['relevant']:
+                    return comment_texts[index]
+            return None
+
+        kept = self.prefilter.filter(comment_texts, post_text)
+        self.prefilter.save_stats()
+        if on_verdict:
+            # Rejections are verdicts too; once stored, the same replies are neither filtered nor counted again
+            kept_indexes = {index for index, _ in kept}
+            for index in range(len(comment_texts)):
+                if index not in kept_indexes:
+                    on_verdict(index, False)
+        chunks = list(self.chunk_comments(kept))
+        return await first_in_rank(chunks, first_valid_in_chunk, max_concurrency)
+
+    async def aselect_comment(self, comments, max_concurrency=4, post_text=None):
+        """
+        Picks the comment to continue the story with.
+        Near-duplicate comments are collapsed into one group ranked by their summed
+        likes, so each group is screened once. Groups matching a comment screened
+        (or rejected by the prefilter) on an earlier run reuse its verdict instead
+        of being screened again.
+        """
+        groups = group_comments(comments, max_distance=self.dedup_index.max_distance)
+
+        pending = []
+        known_valid = None
+        for group in groups:
+            verdict = self.dedup_index.verdict_for(group['fingerprint'])
+            if verdict is None:
+                pending.append(group)
+            elif verdict:
+                # Everything ranked below a known-valid group can never be picked
+                known_valid = group['text']
+                break
+        logging.info(f"Screening {len(pending)} of {len(groups)} comment groups ({len(comments)} comments)")
+
+        def record(index, valid):
+            self.dedup_index.add(pending[index]['fingerprint'], valid)
+
+        selected = await self.aselect_first_valid([group['text'] for group in pending], max_concurrency,
+                                                  post_text=post_text, on_verdict=record)
+        self.dedup_index.save()
+        return selected or known_valid
+
+    def iter_comments(self, post_uri, depth=None):
+        """
+        Yields the replies under a post as they are walked, down to `depth`
+        levels (default: the agent's reply_depth). Nested replies carry their parent's URI.
+        """
+        return iter_replies(self.client, post_uri, max_depth=depth or self.reply_depth)
 
-    def fetch_comments(self, post_uri):
+    def fetch_comments(self, post_uri, depth=None):
         """
         Fetch comments on a post using the post_uri.
         """
         try:
-            # Fetch the thread of the post using the post_uri
-            response = self.client.get_post_thread(uri=post_uri)
-
-            # Extract comments and their metrics from the response
-            comments = []
-            if response:
-                thread = response['thread']
-                if hasattr(thread, 'replies'):
-                    for reply in thread.replies:
-                        if hasattr(reply.post.record, 'text'):
-                            comment_text = reply.post.record.text
-                            like_count = getattr(reply.post, 'like_count', 0)
-                            repost_count = getattr(reply.post, 'repost_count', 0)
-                            comments.append({
-                                'text': comment_text,
-                                'likes': like_count,
-                                'retweets': repost_count
-                            })
-                                # # Check for nested replies
-                                # if hasattr(reply, 'replies'):
-                                #     print('replies in reply')
-                                #     for nested_reply in reply.replies:
-                                #         if hasattr(nested_reply.post.record, 'text'):
-                                #             print('record in nested reply')
-                                #             nested_comment_text = nested_reply.post.record.text
-                                #             print('nested_comment_text:', nested_comment_text)
-                                #             nested_like_count = getattr(nested_reply.post, 'like_count', 0)
-                                #             nested_repost_count = getattr(nested_reply.post, 'repost_count', 0)
-                                #             comments.append({
-                                #                 'text': nested_comment_text,
-                                #                 'likes': nested_like_count,
-                                #                 'retweets': nested_repost_count
-                                #             })
-
-            return comments
+            return list(self.iter_comments(post_uri, depth))
         except AtProtocolError as e:
             logging.error(f"AT Protocol Error fetching comments: {e}")
             print(f"AT Protocol Error fetching comments: {e}")
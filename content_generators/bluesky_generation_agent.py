@@ -1,6 +1,5 @@
 # content_generators/tweet_generation_agent.py
 
-from atproto import Client
 from atproto.exceptions import AtProtocolError
 from datetime import datetime, timezone
 from langchain.chains import LLMChain
@@ -11,53 +10,155 @@ from langchain_core.runnables import RunnableSequence, RunnableMap
 from langchain_core.output_parsers import StrOutputParser
 from .story_phase_manager import StoryPhaseManager
 from .prompt_loader import PromptLoader
-from .story_summary import generate_story_summary
+from .story_summary import RollingStorySummary
+from .provider_fanout import Provider, fan_out
+from .story_context import StoryContextBuilder, budget_for_models
+from .bluesky_session import get_shared_client
+from .story_ledger import StoryLedger
+from .rate_limiter import get_guard, guarded_ainvoke, guarded_invoke
+from .exemplar_index import ExemplarIndex
+from .story_retrieval import StoryRetriever
+from .continuity_checker import ContinuityChecker, ISSUE_MESSAGES
 import os
 import re
+import json
+import asyncio
 import logging
-
-class TweetGenerationAgent:
-    def __init__(self, openai_api_key, anthropic_api_key, config_path='config/phase_prompts.json'):
+import time
+
+# Bluesky's post length limit
+MAX_POST_CHARS = 300
+# Token ceiling of the generation models. Generations are streamed and stopped near
+# MAX_POST_CHARS, so this only has to be high enough never to be what cuts a post short
+GENERATION_MAX_TOKENS = 150
+# What generate_competing_tweets returns when every generation failed
+GENERATION_FAILED = "Oops! Something went wrong. Please try again later."
+
+def build_generation_models(openai_api_key, anthropic_api_key, llm_cache=None):
+    """
+    Builds the chat models used by the generation agent.
+    Returns a dict with the chatgpt, claude, reviewer and summarizer models, plus
+    the fast chatgpt_backup and claude_backup models used for hedging.
+    Their built-in retries are off; calls go through the shared guards in rate_limiter.
+    """
+    return {
         # Initialize the OpenAI LLM
-        self.llm = ChatOpenAI(api_key=openai_api_key,
-                          model_name="gpt-4",
-                          max_tokens=60,
-                          temperature=0.9,
-                          frequency_penalty=0.5,
-                          presence_penalty=0.5)
-
-        self.claude = ChatAnthropic(
+        'chatgpt': ChatOpenAI(api_key=openai_api_key,
+                              model_name="gpt-4",
+                              max_tokens=GENERATION_MAX_TOKENS,
+                              temperature=0.9,
+                              frequency_penalty=0.5,
+                              presence_penalty=0.5,
+                              max_retries=0),
+
+        'claude': ChatAnthropic(
             model="claude-3-5-sonnet-20240620",
             api_key=anthropic_api_key,
-            max_tokens=60,
-            temperature=0.9
-        )
+            max_tokens=GENERATION_MAX_TOKENS,
+            temperature=0.9,
+            max_retries=0
+        ),
+
+        # Hedges for a slow or failing generation, each on the other provider
+        'chatgpt_backup': ChatOpenAI(api_key=openai_api_key,
+                                     model_name="gpt-4o-mini",
+                                     max_tokens=GENERATION_MAX_TOKENS,
+                                     temperature=0.9,
+                                     max_retries=0),
+
+        'claude_backup': ChatAnthropic(
+            model="claude-3-haiku-20240307",
+            api_key=anthropic_api_key,
+            max_tokens=GENERATION_MAX_TOKENS,
+            temperature=0.9,
+            max_retries=0
+        ),
 
-        self.reviewer = ChatOpenAI(
+        # The reviewer also runs the safety check, so repeated reviews are served from the cache
+        'reviewer': ChatOpenAI(
             model="gpt-4",
             api_key=openai_api_key,
             max_tokens=60,
-            temperature=0.2
+            temperature=0.2,
+            cache=llm_cache,
+            max_retries=0
+        ),
+
+        'summarizer': ChatOpenAI(
+            model="gpt-4",
+            api_key=openai_api_key,
+            max_tokens=200,
+            temperature=0.2,
+            max_retries=0
+        ),
+    }
+
+def build_providers(models, limits=None):
+    """
+    The providers competing for each post. Each one is hedged by a fast model
+    of the other provider, so a slow tail or an outage on one side still yields two candidates.
+    `limits` optionally maps "openai"/"anthropic" to shared asyncio.Semaphores.
+    """
+    limits = limits or {}
+    openai_guard = get_guard("openai")
+    anthropic_guard = get_guard("anthropic")
+    return [
+        Provider("chatgpt", models['chatgpt'], limit=limits.get("openai"), guard=openai_guard,
+                 backup=Provider("claude-haiku", models['claude_backup'], limit=limits.get("anthropic"),
+                                 guard=anthropic_guard)),
+        Provider("claude", models['claude'], limit=limits.get("anthropic"), guard=anthropic_guard,
+                 backup=Provider("gpt-4o-mini", models['chatgpt_backup'], limit=limits.get("openai"),
+                                 guard=openai_guard)),
+    ]
+
+class TweetGenerationAgent:
+    def __init__(self, openai_api_key, anthropic_api_key, config_path='config/phase_prompts.json',
+                 providers=None, generation_deadline=60, soft_deadline=20, llm_cache=None, client=None,
+                 ledger_path=None, models=None, actor=None, data_dir='logs', phase_manager=None,
+                 exemplar_count=3):
+        # Models can be shared between stories; pass `models` to reuse them (see build_generation_models)
+        models = models or build_generation_models(openai_api_key, anthropic_api_key, llm_cache)
+        self.llm = models['chatgpt']
+        self.claude = models['claude']
+        self.reviewer = models['reviewer']
+        self.summarizer = models['summarizer']
+        # Per-story state (ledger, rolling summary) lives under `data_dir`
+        self.data_dir = data_dir
+        self.story_summary = RollingStorySummary(self.summarizer,
+                                                 summary_dir=os.path.join(data_dir, 'story_summaries'),
+                                                 guard=get_guard("openai"))
+
+        # Models competing for each post; pass `providers` to add or swap models
+        self.providers = providers or build_providers(models)
+        # Past the soft deadline generation goes on with whatever candidates are ready;
+        # the hard deadline bounds the wait for the first one
+        self.generation_deadline = generation_deadline
+        self.soft_deadline = soft_deadline
+        self.context_builder = StoryContextBuilder(
+            token_budget=budget_for_models([provider.llm for provider in self.providers])
         )
-        
+
         # Initialize other components
-        self.phase_manager = StoryPhaseManager()
+        self.phase_manager = phase_manager or StoryPhaseManager()
         self.prompt_loader = PromptLoader(config_path)
-        self.client = Client()
-        
-        # Load Bluesky credentials from environment variables
+        # Shares one persisted Bluesky session with the comment agent
+        self.client = client or get_shared_client()
         self.handle = os.getenv("BLUESKY_HANDLE")
-        self.password = os.getenv("BLUESKY_PASSWORD")
+        # The account whose feed holds this story
+        self.actor = actor or self.handle or 'collectivelore.bsky.social'
         self.base_url = "https://bsky.app"  # Replace with actual Bluesky base URL if different
-
-        try:
-            # Authenticate with Bluesky
-            self.client.login(self.handle, self.password)
-            logging.info("Successfully authenticated with Bluesky.")
-        except AtProtocolError as e:
-            logging.error(f"AT Protocol Error during authentication: {e}")
-        except Exception as e:
-            logging.error(f"Unexpected error during authentication: {e}")
+        self.ledger = StoryLedger(ledger_path or os.path.join(data_dir, 'story_ledger.sqlite3'))
+        # Best-received posts per phase, fed by engagement snapshots; a few are shown to the model
+        self.exemplars = ExemplarIndex(os.path.join(data_dir, 'exemplars.json'))
+        self.exemplar_count = exemplar_count
+        # Local BM25 index of the month's posts for callbacks to earlier beats
+        self.retriever = StoryRetriever()
+        # Catches repeated, stalled or comment-ignoring candidates before the reviewer sees them
+        self.continuity = ContinuityChecker()
+        # Posts the reviewer already judged safe, with its reason; they skip the separate safety check
+        self.approved = {}
+        # Posts the reviewer judged unsafe; its verdict is final, so they are never posted
+        self.rejected = set()
 
     def remove_incomplete_sentence(self, text):
         """
@@ -70,7 +171,7 @@ class TweetGenerationAgent:
         # Join the sentences together until the total length is within the limit
         output = ''
         for sentence in sentences:
-            if len(output) + len(sentence) <= 300:  # Respect character limit
+            if len(output) + len(sentence) <= MAX_POST_CHARS:  # Respect character limit
                 output += sentence
             else:
                 break
@@ -78,49 +179,75 @@ class TweetGenerationAgent:
         # If no complete sentence is found, return the original text (safeguard)
         return output.strip() if output else text.strip()
     
+    def build_story_context(self, recent_posts):
+        """
+        Joins the month's posts into a story context that fits every provider's token budget.
+        """
+        return self.context_builder.build(recent_posts, summary=self.story_summary.get_summary())
+
+    def track_story(self, recent_posts):
+        """
+        Brings the local story indexes up to date with the month's posts.
+        """
+        self.retriever.sync(recent_posts)
+        self.continuity.sync(recent_posts)
+
+    def find_callbacks(self, recent_posts, user_comment=None, k=3):
+        """
+        Earlier posts of the month most relevant to the latest post and the chosen comment.
+        """
+        if not recent_posts:
+            return []
+        return self.retriever.callbacks(recent_posts, recent_posts[-1], user_comment, k=k,
+                                        skip_recent=self.context_builder.keep_recent)
+
+    async def update_story_summary(self, recent_posts):
+        """
+        Folds the posts made since the last run into this month's rolling summary.
+        """
+        return await self.story_summary.update(recent_posts)
+
     def evaluate_output(self, output, user_feedback):
-        issues = []
-        if user_feedback:
-            if not user_comment_included(output, user_feedback):
-                issues.append("- The draft does not adequately incorporate the user comment.")
-        # Common checks for all scenarios
-        if not advances_plot(output):
-            issues.append("- The draft does not effectively advance the plot.")
-        if not maintains_tone(output):
-            issues.append("- The draft does not maintain the consistent tone and style.")
-        if repeats_content(output):
-            issues.append("- The draft repeats content unnecessarily.")
+        """
+        Lists what is wrong with a draft according to the local continuity checks, or None.
+        """
+        verdict = self.continuity.check(output, user_feedback)
+        issues = [ISSUE_MESSAGES[issue] for issue in verdict['issues']]
         return "\n".join(issues) if issues else None
 
 
-    def generate_tweet(self, last_tweet=None, user_comment=None):
+    def build_prompt_text(self, last_tweet=None, user_comment=None, callbacks=None):
+        """
+        Builds the generation prompt for the current phase.
+        Returns the prompt text along with the story context and phase details
+        so the reviewer can judge candidates against the same material.
+        """
         phase = self.phase_manager.get_current_phase()
+        phase_prompt = self.prompt_loader.get_prompt(phase)
+        context = ""
 
         # If length of the last tweet is equal to zero, set temp phase to exposition
         if not last_tweet or len(last_tweet) == 0:
             temp_phase = "exposition"
             prompt_text = self.prompt_loader.get_prompt(temp_phase)
-        elif phase == "exposition" and not last_tweet:
-            prompt_text = self.prompt_loader.get_prompt(phase)
         else:
-            if (last_tweet or len(last_tweet) > 0):
-                context = f"Previous Posts: \"{last_tweet}\"\n\n"
-                if user_comment:
-                    context += f"User Comment: \"{user_comment}\"\n\n"
-                    emphasis_instructions = (
-                                "1. **Focus** on the user comment, making it the central element of the next part of the story.\n"
-                                "2. **Integrate** elements from previous posts to maintain continuity.\n"
-                                )
-                else:
-                    emphasis_instructions = (
-                                "1. **Advance** the story by introducing new developments or escalating tension based on the previous posts.\n"
-                                "2. **Build upon the most recent section of the story, ensuring a cohesive continuation.**\n"
-                                )
-            else:
-                context = ""
-            if (last_tweet or len(last_tweet) > 0) and not user_comment:
-                # **Enhancement:** Include the phase prompt when previous posts are present
-                phase_prompt = self.prompt_loader.get_prompt(phase)
+            context = f"Previous Posts: \"{last_tweet}\"\n\n"
+            if phase == "resolution":
+                summary = self.story_summary.get_summary()
+                # A story context that had to be compressed already opens with the summary
+                if summary and summary not in last_tweet:
+                    context = f"Story Summary: \"{summary}\"\n\n" + context
+            # Earlier beats the story context only has in compressed form (or not at all)
+            callbacks = [post for post in callbacks or [] if post not in last_tweet]
+            if callbacks:
+                context += "Earlier Details To Call Back To:\n" + "".join(f"- \"{post}\"\n" for post in callbacks) + "\n"
+            if user_comment:
+                context += f"User Comment: \"{user_comment}\"\n\n"
+                emphasis_instructions = (
+                            "1. **Focus** on the user comment, making it the central element of the next part of the story.\n"
+                            "2. **Integrate** elements from previous posts to maintain continuity.\n"
+                            )
+                # **Enhancement:** Include the phase prompt when user comments are present
                 prompt_text = (
                     "Continue the following story based on the context below. "
                     f"{context}"
@@ -130,16 +257,34 @@ class TweetGenerationAgent:
                     f"{emphasis_instructions}"
                     "3. **Maintain** continuity with previous posts, incorporating necessary elements to keep the story cohesive.\n"
                     "4. **Advance** the plot meaningfully, introducing new developments.\n"
-                    "5. **Do not** repeat any sentences or phrases verbatim from previous posts unless they serve a specific narrative purpose, such as emphasizing an important detail.\n"
-                    "6. **Add** dialogue where appropriate, as long as it advances the plot.\n"
-                    "7. **Keep** the tone, style, and pacing consistent with the story so far.\n"
-                    "8. **Do not** include the instructions or any meta-commentary in your output.\n"
-                    "9. **Provide only** the next part of the story.\n\n"
+                    "5. **Keep** the tone, style, and pacing consistent with the story so far.\n"
+                    "6. **Do not** include the instructions or any meta-commentary in your output.\n"
+                    "7. **Provide only** the next part of the story.\n\n"
                     "Now, generate the next post in the storyline."
+
+                    # "Ensure language is fluid, engaging, and varied in sentence structure, avoiding repetitive openings or phrasing. "
+                    # "Each post should clearly advance the plot to add new details, escalate tension, or introduce fresh elements to keep the story dynamic and avoid stalling. "
+                    # "**Do not repeat any sentences or phrases verbatim from previous posts** unless they serve a specific narrative purpose, such as emphasizing an important detail. "
+                    # "Keep the pacing brisk to fit a short story format of around 9,000 characters total, making each post concise yet impactful. "
+                    # "Blend imaginative ideas smoothly with prior events for continuity. "
+                    # "Follow the prompt below as the primary guide for the story’s direction, tone, and pacing. This should strongly influence each scene and ensure progression toward the story's goals:\n\n"
+                    # "Write in the style of a top short story author within the genre of this story, ensuring the language is fluid, engaging, and dynamically varied in sentence structure. "
+                    # "**Do not repeat any sentences or phrases verbatim from previous posts** unless they serve a specific narrative purpose, such as emphasizing an important detail. "
+                    # "Ensure the story advances in a way that builds upon past events while introducing new elements or developments. "
+                    # "Use varied sentence structures and openers to maintain freshness and keep the reader engaged. "
+                    # "Remember that this is a short story with a total length of around 9,000 characters by the end; space the story elements accordingly, making each post concise yet impactful. "
+                    # "Move the plot forward decisively, revealing new details, advancing the storyline, or escalating tension to prevent the narrative from stalling. "
+                    # "Keep the pacing brisk to fit the daily format while allowing room for character depth and story-building elements. "
+                    # "Incorporate imaginative or unconventional ideas to enhance the storyline while ensuring continuity with previous posts and smoothly integrating the new direction. "
+                    # "Create engaging character development, build tension or excitement, and use dynamic language to move the plot forward.\n\n**"
+                    # "Generate the next post in the storyline."
                 )
-            elif (last_tweet or len(last_tweet) > 0) and user_comment:
-                # **Enhancement:** Include the phase prompt when user comments are present
-                phase_prompt = self.prompt_loader.get_prompt(phase)
+            else:
+                emphasis_instructions = (
+                            "1. **Advance** the story by introducing new developments or escalating tension based on the previous posts.\n"
+                            "2. **Build upon the most recent section of the story, ensuring a cohesive continuation.**\n"
+                            )
+                # **Enhancement:** Include the phase prompt when previous posts are present
                 prompt_text = (
                     "Continue the following story based on the context below. "
                     f"{context}"
@@ -149,17 +294,28 @@ class TweetGenerationAgent:
                     f"{emphasis_instructions}"
                     "3. **Maintain** continuity with previous posts, incorporating necessary elements to keep the story cohesive.\n"
                     "4. **Advance** the plot meaningfully, introducing new developments.\n"
-                    "5. **Keep** the tone, style, and pacing consistent with the story so far.\n"
-                    "6. **Do not** include the instructions or any meta-commentary in your output.\n"
-                    "7. **Provide only** the next part of the story.\n\n"
+                    "5. **Do not** repeat any sentences or phrases verbatim from previous posts unless they serve a specific narrative purpose, such as emphasizing an important detail.\n"
+                    "6. **Add** dialogue where appropriate, as long as it advances the plot.\n"
+                    "7. **Keep** the tone, style, and pacing consistent with the story so far.\n"
+                    "8. **Do not** include the instructions or any meta-commentary in your output.\n"
+                    "9. **Provide only** the next part of the story.\n\n"
                     "Now, generate the next post in the storyline."
                 )
-            else:
-                # Autonomous continuation based on current phase
-                prompt_text = self.prompt_loader.get_prompt(phase)
+
+        examples = self.exemplars.best("exposition" if not last_tweet else phase, self.exemplar_count)
+        if examples:
+            prompt_text += (
+                "\n\nPosts in this phase that readers loved (match their quality and energy; do not copy them):\n"
+                + "".join(f"- \"{example}\"\n" for example in examples)
+                + "\n"
+            )
 
         prompt_text += "**Ensure the response does not exceed 300 characters and ends at a natural stopping point or a complete sentence!**"
         logging.info(f'prompt text: {prompt_text}')
+        return prompt_text, context, phase, phase_prompt
+
+    def generate_tweet(self, last_tweet=None, user_comment=None):
+        prompt_text, _, _, _ = self.build_prompt_text(last_tweet, user_comment)
 
         # Define the prompt template
         prompt = PromptTemplate(
@@ -172,7 +328,7 @@ class TweetGenerationAgent:
 
         try:
             # Run the chain to generate the tweet
-            tweet = chain.invoke(input={})
+            tweet = guarded_invoke("openai", chain, input={})
             logging.debug(f"Generated Tweet Before Post-Processing: {tweet}")
 
             # Post-processing: Remove incomplete sentence if needed
@@ -183,91 +339,80 @@ class TweetGenerationAgent:
         except Exception as e:
             logging.error(f"Error generating post: {e}")
             return "Oops! Something went wrong. Please try again later."
-        
-    async def generate_competing_tweets(self, last_tweet=None, user_comment=None):
-        phase = self.phase_manager.get_current_phase()
 
-        # If length of the last tweet is equal to zero, set temp phase to exposition
-        if not last_tweet or len(last_tweet) == 0:
-            temp_phase = "exposition"
-            prompt_text = self.prompt_loader.get_prompt(temp_phase)
-        elif phase == "exposition" and not last_tweet:
-            prompt_text = self.prompt_loader.get_prompt(phase)
+    def parse_review_choice(self, review_text, candidate_count):
+        """
+        Returns the zero-based index of the candidate picked by the reviewer.
+        Falls back to the first candidate if no valid choice is found.
+        """
+        for match in re.findall(r'\b(\d+)\b', review_text):
+            choice = int(match)
+            if 1 <= choice <= candidate_count:
+                return choice - 1
+        return 0
+
+    def parse_review(self, review_text, candidate_count):
+        """
+        Parses the reviewer's JSON verdict: {"choice": n, "safe": [bool, ...], "reason": "..."}.
+        Returns (zero-based choice, list of safety verdicts or None, reason).
+        Safety verdicts are None unless there is exactly one per candidate.
+        """
+        try:
+            verdict = json.loads(re.search(r'\{.*\}', review_text, re.DOTALL).group(0))
+        except (AttributeError, ValueError):
+            logging.error(f"Reviewer did not return JSON: {review_text}")
+            return self.parse_review_choice(review_text, candidate_count), None, ""
+
+        choice = verdict.get('choice')
+        if isinstance(choice, int) and 1 <= choice <= candidate_count:
+            choice -= 1
         else:
-            if (last_tweet or len(last_tweet) > 0):
-                context = f"Previous Posts: \"{last_tweet}\"\n\n"
-                if user_comment:
-                    context += f"User Comment: \"{user_comment}\"\n\n"
-                    emphasis_instructions = (
-                                "1. **Focus** on the user comment, making it the central element of the next part of the story.\n"
-                                "2. **Integrate** elements from previous posts to maintain continuity.\n"
-                                )
-                else:
-                    emphasis_instructions = (
-                                "1. **Advance** the story by introducing new developments or escalating tension based on the previous posts.\n"
-                                "2. **Build upon the most recent section of the story, ensuring a cohesive continuation.**\n"
-                                )
-            else:
-                context = ""
-            if (last_tweet or len(last_tweet) > 0) and not user_comment:
-                # **Enhancement:** Include the phase prompt when previous posts are present
-                phase_prompt = self.prompt_loader.get_prompt(phase)
-                prompt_text = (
-                    "Continue the following story based on the context below. "
-                    f"{context}"
-                    "Write the next part of the story in the style of a top short story author in this genre. "
-                    f"**{phase_prompt}**\n\n"
-                    "Instructions:\n"
-                    f"{emphasis_instructions}"
-                    "3. **Maintain** continuity with previous posts, incorporating necessary elements to keep the story cohesive.\n"
-                    "4. **Advance** the plot meaningfully, introducing new developments.\n"
-                    "5. **Do not** repeat any sentences or phrases verbatim from previous posts unless they serve a specific narrative purpose, such as emphasizing an important detail.\n"
-                    "6. **Add** dialogue where appropriate, as long as it advances the plot.\n"
-                    "7. **Keep** the tone, style, and pacing consistent with the story so far.\n"
-                    "8. **Do not** include the instructions or any meta-commentary in your output.\n"
-                    "9. **Provide only** the next part of the story.\n\n"
-                    "Now, generate the next post in the storyline."
-                )
-            elif (last_tweet or len(last_tweet) > 0) and user_comment:
-                # **Enhancement:** Include the phase prompt when user comments are present
-                phase_prompt = self.prompt_loader.get_prompt(phase)
-                prompt_text = (
-                    "Continue the following story based on the context below. "
-                    f"{context}"
-                    "Write the next part of the story in the style of a top short story author in this genre. "
-                    f"**{phase_prompt}**\n\n"
-                    "Instructions:\n"
-                    f"{emphasis_instructions}"
-                    "3. **Maintain** continuity with previous posts, incorporating necessary elements to keep the story cohesive.\n"
-                    "4. **Advance** the plot meaningfully, introducing new developments.\n"
-                    "5. **Keep** the tone, style, and pacing consistent with the story so far.\n"
-                    "6. **Do not** include the instructions or any meta-commentary in your output.\n"
-                    "7. **Provide only** the next part of the story.\n\n"
-                    "Now, generate the next post in the storyline."
-                    
-                    # "Ensure language is fluid, engaging, and varied in sentence structure, avoiding repetitive openings or phrasing. "
-                    # "Each post should clearly advance the plot to add new details, escalate tension, or introduce fresh elements to keep the story dynamic and avoid stalling. "
-                    # "**Do not repeat any sentences or phrases verbatim from previous posts** unless they serve a specific narrative purpose, such as emphasizing an important detail. "
-                    # "Keep the pacing brisk to fit a short story format of around 9,000 characters total, making each post concise yet impactful. "
-                    # "Blend imaginative ideas smoothly with prior events for continuity. "
-                    # "Follow the prompt below as the primary guide for the story’s direction, tone, and pacing. This should strongly influence each scene and ensure progression toward the story's goals:\n\n"
-                    # "Write in the style of a top short story author within the genre of this story, ensuring the language is fluid, engaging, and dynamically varied in sentence structure. "
-                    # "**Do not repeat any sentences or phrases verbatim from previous posts** unless they serve a specific narrative purpose, such as emphasizing an important detail. "
-                    # "Ensure the story advances in a way that builds upon past events while introducing new elements or developments. "
-                    # "Use varied sentence structures and openers to maintain freshness and keep the reader engaged. "
-                    # "Remember that this is a short story with a total length of around 9,000 characters by the end; space the story elements accordingly, making each post concise yet impactful. "
-                    # "Move the plot forward decisively, revealing new details, advancing the storyline, or escalating tension to prevent the narrative from stalling. "
-                    # "Keep the pacing brisk to fit the daily format while allowing room for character depth and story-building elements. "
-                    # "Incorporate imaginative or unconventional ideas to enhance the storyline while ensuring continuity with previous posts and smoothly integrating the new direction. "
-                    # "Create engaging character development, build tension or excitement, and use dynamic language to move the plot forward.\n\n**"
-                    # "Generate the next post in the storyline."
-                )
-            else:
-                # Autonomous continuation based on current phase
-                prompt_text = self.prompt_loader.get_prompt(phase)
+            choice = self.parse_review_choice(str(choice), candidate_count)
+        safe = verdict.get('safe')
+        if not (isinstance(safe, list) and len(safe) == candidate_count and all(isinstance(s, bool) for s in safe)):
+            safe = None
+        return choice, safe, str(verdict.get('reason', ''))
 
-        prompt_text += "**Ensure the response does not exceed 300 characters and ends at a natural stopping point or a complete sentence!**"
-        logging.info(f'prompt text: {prompt_text}')
+    async def check_safety(self, text):
+        """
+        Asks the reviewer whether a post is fit to publish. Errors count as unsafe.
+        """
+        safety_prompt = (
+            f"Is the following post appropriate for an adult audience and free from offensive or controversial content? "
+            f"Respond with 'Yes' or 'No'.\n\nPost: \"{text}\""
+        )
+        try:
+            # For ChatOpenAI, we need to pass a messages list
+            messages = [{"role": "user", "content": safety_prompt}]
+            response = await guarded_ainvoke("openai", self.reviewer, messages)
+            return "yes" in response.content.lower()
+        except Exception as e:
+            logging.error(f"Error checking content safety: {e}")
+            return False
+
+    async def settle_safety(self, text, checks, budget=None):
+        """
+        Waits for the safety check started on `text` during generation, if any,
+        and marks the post approved when it passed.
+        """
+        check = checks.pop(text, None)
+        if check is None:
+            return
+        safe = await (check if budget is None else budget.run("safety", check, fallback=False))
+        if safe:
+            self.approved[text] = "passed the safety check during generation"
+
+    async def generate_competing_tweets(self, last_tweet=None, user_comment=None, budget=None, callbacks=None):
+        """
+        Generates a post with every provider and lets the reviewer pick the best.
+        Generations are streamed and cut off near the post length limit. When the
+        review can't run (one provider, reviewer skipped, or a lone candidate past
+        the soft deadline), the first candidate's safety check starts as soon as it
+        is ready; otherwise safety is left to the combined review.
+        With a JobBudget, generation and review are bounded by their allowances
+        and degrade to a single provider / no review when the budget runs low.
+        """
+        prompt_text, context, phase, phase_prompt = self.build_prompt_text(last_tweet, user_comment, callbacks)
 
         # Define the prompt template
         prompt = PromptTemplate(
@@ -275,44 +420,57 @@ class TweetGenerationAgent:
             template=prompt_text
         )
 
-        # Initialize the LLMChain
-        chatgpt_chain = prompt | self.llm | StrOutputParser()
-        claude_chain = prompt | self.claude | StrOutputParser()
+        if budget is None:
+            providers, deadline, soft_deadline = self.providers, self.generation_deadline, self.soft_deadline
+        else:
+            providers = self.providers[:1] if budget.degrade("single_provider") else self.providers
+            deadline = min(self.generation_deadline, budget.allowance("generation"))
+            soft_deadline = min(self.soft_deadline, deadline)
+        # Without a review, the first candidate is the post; its safety check needn't wait for the others
+        no_review = len(providers) == 1 or (budget is not None and budget.active("skip_reviewer"))
+        start = time.monotonic()
+
+        # Safety checks started on finished candidates, by post-processed text
+        safety_checks = {}
+
+        def on_candidate(name, text):
+            # A first candidate past the soft deadline is returned alone, so it won't be reviewed either
+            past_soft = soft_deadline is not None and time.monotonic() - start >= soft_deadline
+            if safety_checks or not (no_review or past_soft):
+                return
+            text = self.remove_incomplete_sentence(text).strip()
+            safety_checks[text] = asyncio.ensure_future(self.check_safety(text))
 
         try:
-            # Run the chains to generate tweets asynchronously
-            try:
-                chatgpt_tweet = await chatgpt_chain.ainvoke(input={})  # Fixed await syntax
-                logging.debug(f"Generated chatgpt tweet: {chatgpt_tweet}")
-            except Exception as e:
-                logging.error(f"Error generating chatgpt tweet: {e}")
-
-            try:
-                claude_tweet = await claude_chain.ainvoke(input={})
-                logging.debug(f"Generated claude tweet: {claude_tweet}")
-            except Exception as e:
-                logging.error(f"Error generating claude tweet: {e}")
+            # Run every provider at once so the job only pays for the slowest one
+            generation = fan_out(prompt, providers, deadline=deadline, soft_deadline=soft_deadline,
+                                 max_chars=MAX_POST_CHARS, on_candidate=on_candidate)
+            if budget is None:
+                candidates = await generation
+            else:
+                candidates = await budget.run("generation", generation, fallback=list)
 
             # Only proceed if at least one tweet was generated
-            if not chatgpt_tweet and not claude_tweet:
-                raise Exception("Both tweet generations failed")
-
-            # Use the non-empty tweet if one failed
-            if not chatgpt_tweet:
-                return claude_tweet.strip()
-            if not claude_tweet:
-                return chatgpt_tweet.strip()
+            if not candidates:
+                raise Exception("All post generations failed")
 
             # Post-processing
-            chatgpt_tweet = self.remove_incomplete_sentence(chatgpt_tweet)
-            claude_tweet = self.remove_incomplete_sentence(claude_tweet)
-
-            # print("\n=== Generated Competing Tweets ===")
-            # print(f"ChatGPT: {chatgpt_tweet}")
-            # print(f"Claude: {claude_tweet}")
-            logging.info(f"Generated tweets - ChatGPT: {chatgpt_tweet}, Claude: {claude_tweet}")
+            candidates = [(name, self.remove_incomplete_sentence(text)) for name, text in candidates]
+            logging.info("Generated posts - " + ", ".join(f"{name}: {text}" for name, text in candidates))
+            # Drop candidates that repeat the story and put the ones with fewer issues first
+            candidates = self.continuity.screen(candidates, user_comment)
+
+            # Nothing to compare if only one candidate made it
+            if len(candidates) == 1 or (budget is not None and budget.degrade("skip_reviewer")):
+                text = candidates[0][1].strip()
+                await self.settle_safety(text, safety_checks, budget)
+                return text
+
+            candidate_lines = "\n".join(
+                f"            Post {i}: {text}" for i, (_, text) in enumerate(candidates, start=1)
+            )
 
-            # Review and select best tweet
+            # Review, select the best tweet and safety-check every candidate in one call
             review_prompt = f"""
             You are a creative storyteller and social media manager,
             evaluating story continuations for an ongoing narrative.
@@ -323,28 +481,57 @@ class TweetGenerationAgent:
             Current Story Phase: {phase}
             Phase Guidelines: {phase_prompt}
 
-            Compare these two generated story continuations and select the better one based on:
+            Compare these {len(candidates)} generated story continuations and select the best one based on:
             1. Coherence with previous story elements
             2. Alignment with current story phase
             3. Writing quality and likelihood of engagement
             4. Character and plot development
-            
-            Tweet 1: {chatgpt_tweet}
-            Tweet 2: {claude_tweet}
-            
-            Provide your choice (1 or 2) and a brief explanation.
+
+{candidate_lines}
+
+            Also check each post: is it appropriate for an adult audience and free from
+            offensive or controversial content?
+
+            Respond with JSON only, no other text:
+            {{"choice": <1 to {len(candidates)}>, "safe": [<true or false for each post, in order>], "reason": "<at most 12 words>"}}
             """
-            
-            review_result = await self.reviewer.ainvoke([{"role": "user", "content": review_prompt}])
-            # print("\n=== Reviewer's Analysis ===")
-            # print(review_result.content)
+
+            review_call = guarded_ainvoke("openai", self.reviewer, [{"role": "user", "content": review_prompt}])
+            if budget is None:
+                review_result = await review_call
+            else:
+                review_result = await budget.run("review", review_call)
+                if review_result is None:
+                    text = candidates[0][1].strip()
+                    await self.settle_safety(text, safety_checks, budget)
+                    return text
             logging.info(f"Reviewer's analysis: {review_result.content}")
 
-            return chatgpt_tweet.strip() if "1" in review_result.content else claude_tweet.strip()
+            choice, safe, reason = self.parse_review(review_result.content, len(candidates))
+            if safe is None:
+                # No usable safety verdict; the job runs its own check unless one already ran
+                text = candidates[choice][1].strip()
+                await self.settle_safety(text, safety_checks, budget)
+                return text
+            if not safe[choice]:
+                # Fall back to the best-ranked candidate that passed
+                passing = [index for index, ok in enumerate(safe) if ok]
+                if not passing:
+                    logging.info("Reviewer found every candidate unsafe.")
+                    text = candidates[choice][1].strip()
+                    self.rejected.add(text)
+                    return text
+                choice = passing[0]
+            text = candidates[choice][1].strip()
+            self.approved[text] = reason
+            return text
 
         except Exception as e:
             logging.error(f"Error generating competing posts: {e}")
-            return "Oops! Something went wrong. Please try again later."
+            return GENERATION_FAILED
+        finally:
+            for check in safety_checks.values():
+                check.cancel()
 
     def post_tweet(self, tweet):
         try:
@@ -367,6 +554,9 @@ class TweetGenerationAgent:
             post_id = response.cid
             post_uri = response.uri
 
+            # Record the post right away so the next sync stops at it
+            self.ledger.add(post_uri, post_id, tweet, now)
+
             return post_id, post_uri
 
         except AtProtocolError as e:
@@ -391,41 +581,21 @@ class TweetGenerationAgent:
             logging.error(f"Unexpected error fetching last post: {e}")
             return None, None
         
-    def fetch_recent_posts(self, limit=31):
+    def fetch_recent_posts(self, limit=25):
         """
-        Fetch the most recent posts from the author's feed (your own posts).
-        Returns a list of recent posts.
+        Fetch this month's story from our own posts.
+        Only posts newer than the ledger's latest are read from the author feed
+        (`limit` is the feed page size); the story itself comes from the ledger.
+        Returns the story posts in the order they were sent and the URI of the most recent one.
         """
         try:
-            # Fetch the author's feed with the specified limit
-            response = self.client.get_author_feed(actor='collectivelore.bsky.social', limit=limit)
-
-            try:
-                posts = response['feed']
-                # Extract the text content of each post
-                recent_posts = [post.post.record.text for post in posts if hasattr(post.post.record, 'text') and post.reply is None]
-                post_uris = [post.post.uri for post in posts if hasattr(post.post, 'uri') and hasattr(post.post.record, 'text') and post.reply is None]
-            except Exception as e:
-                logging.error(f"Error fetching recent posts last try: {e}")
-
-            if recent_posts:
-                # Find the index of the first occurrence of a string that starts with "Welcome to a new month"
-                first_index = next((i for i in range(len(recent_posts)) if recent_posts[i].startswith("Welcome to a new month")), -1)
-
-                # Use everything in recent_posts after that index
-                if first_index != 0:
-                    recent_posts = recent_posts[:first_index]
-                    relevant_post_uris = post_uris[:first_index]
-                
-                # Reverse the order of recent_posts to get the in order of when sent
-                recent_posts.reverse()
-                most_recent_post_uri = relevant_post_uris[0]
-
-                return recent_posts, most_recent_post_uri
-            else:
-                logging.error("No posts found.")
-                return []
+            self.ledger.sync(self.client, actor=self.actor, page_size=limit)
+        except AtProtocolError as e:
+            logging.error(f"AT Protocol Error syncing story ledger: {e}")
         except Exception as e:
-            logging.error(f"Error fetching recent posts: {e}")
-            return []
+            logging.error(f"Error syncing story ledger: {e}")
 
+        recent_posts, most_recent_post_uri = self.ledger.current_story()
+        if not recent_posts:
+            logging.error("No posts found.")
+        return recent_posts, most_recent_post_uri
@@ -0,0 +1,118 @@
+# content_generators/bluesky_session.py
+
+import logging
+import os
+
+from atproto import Client, SessionEvent
+from atproto.exceptions import AtProtocolError
+
+from .rate_limiter import get_guard
+
+# Client methods that create, change or delete records count against the write limit
+WRITE_PREFIXES = ('send_', 'post', 'delete_', 'like', 'unlike', 'repost', 'unrepost', 'follow', 'unfollow',
+                  'upload_blob', 'create_')
+
+
+class GuardedClient:
+    """
+    Wraps an atproto Client so every method call goes through the shared Bluesky
+    rate limit, retry policy and circuit breaker. Reads and writes have separate
+    limits, and writes are not retried (see GUARD_OPTIONS).
+    """
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr) or name.startswith('_') or name in ('on_session_change', 'export_session_string'):
+            return attr
+        guard = get_guard("bluesky.write" if name.startswith(WRITE_PREFIXES) else "bluesky.read")
+
+        def guarded(*args, **kwargs):
+            return guard.call_sync(attr, *args, **kwargs)
+        return guarded
+
+
+class BlueskySession:
+    """
+    One Bluesky client shared by every agent.
+    The exported session string is kept in `session_path` and resumed on startup;
+    the client refreshes the access JWT on its own whenever it expires, and a
+    full password login only happens when the stored refresh token is no longer
+    accepted (or there is no stored session yet).
+    """
+    def __init__(self, handle=None, password=None, session_path='logs/bluesky_session.txt'):
+        self.handle = handle or os.getenv("BLUESKY_HANDLE")
+        self.password = password or os.getenv("BLUESKY_PASSWORD")
+        self.session_path = session_path
+        self.client = None
+
+    def load_session(self):
+        if not os.path.exists(self.session_path):
+            return None
+        try:
+            with open(self.session_path, 'r', encoding='utf-8') as file:
+                return file.read().strip() or None
+        except OSError as e:
+            logging.error(f"Error reading Bluesky session: {e}")
+            return None
+
+    def save_session(self, session_string):
+        try:
+            os.makedirs(os.path.dirname(self.session_path) or '.', exist_ok=True)
+            # The session string holds the refresh token, so keep it private
+            fd = os.open(self.session_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                file.write(session_string)
+        except OSError as e:
+            logging.error(f"Error saving Bluesky session: {e}")
+
+    def on_session_change(self, event, session):
+        if event in (SessionEvent.CREATE, SessionEvent.REFRESH):
+            self.save_session(session.export())
+
+    def get_client(self):
+        if self.client is None:
+            self.client = GuardedClient(self.login())
+        return self.client
+
+    def login(self):
+        client = Client()
+        client.on_session_change(self.on_session_change)
+
+        session_string = self.load_session()
+        if session_string:
+            try:
+                # Resuming refreshes the access JWT if needed, without a createSession call
+                get_guard("bluesky.read").call_sync(client.login, session_string=session_string)
+                logging.info("Resumed Bluesky session.")
+                return client
+            except Exception as e:
+                logging.error(f"Stored Bluesky session could not be resumed, logging in again: {e}")
+
+        # Raises if the login fails, so no unauthenticated client is kept;
+        # the next get_client call tries again
+        try:
+            # Authenticate with Bluesky
+            get_guard("bluesky.session").call_sync(client.login, self.handle, self.password)
+            logging.info("Successfully authenticated with Bluesky.")
+        except AtProtocolError as e:
+            logging.error(f"AT Protocol Error during authentication: {e}")
+            raise
+        except Exception as e:
+            logging.error(f"Unexpected error during authentication: {e}")
+            raise
+        return client
+
+
+_shared_session = None
+
+
+def get_shared_client():
+    """
+    Returns the process-wide Bluesky client, logging in (or resuming) on first use.
+    """
+    global _shared_session
+    if _shared_session is None:
+        _shared_session = BlueskySession()
+    return _shared_session.get_client()
@@ -0,0 +1,133 @@
+# content_generators/comment_dedup.py
+
+import hashlib
+import json
+import logging
+import os
+import re
+from datetime import datetime, timedelta
+
+FINGERPRINT_BITS = 64
+
+
+def normalize(text):
+    text = re.sub(r'(https?://\S+|www\.\S+|[@#]\S+)', ' ', (text or "").lower())
+    return " ".join(re.sub(r'[^\w\s]', ' ', text).split())
+
+
+def shingles(text):
+    """
+    Word unigrams and bigrams of the normalized text; comments are too short for longer shingles.
+    """
+    words = normalize(text).split()
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+def simhash(text):
+    counts = [0] * FINGERPRINT_BITS
+    for shingle in shingles(text):
+        value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(FINGERPRINT_BITS):
+            counts[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(FINGERPRINT_BITS) if counts[bit] > 0)
+
+
+def hamming_distance(first, second):
+    return bin(first ^ second).count('1')
+
+
+def band_keys(fingerprint, bands):
+    band_bits = FINGERPRINT_BITS // bands
+    mask = (1 << band_bits) - 1
+    return [(band, fingerprint >> (band * band_bits) & mask) for band in range(bands)]
+
+
+class SimHashIndex:
+    """
+    Fingerprints of comments that have already been screened, with their verdict.
+    Fingerprints are split into max_distance + 1 bands: two fingerprints within
+    max_distance bits of each other always share a band, so a lookup only
+    compares the fingerprints in the same band buckets.
+    The index is kept in `path` so verdicts carry over between days.
+    """
+    def __init__(self, path='logs/comment_simhash.json', max_distance=7, ttl_days=30):
+        self.path = path
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.ttl_days = ttl_days
+        self.entries = {}
+        self.buckets = {}
+        self.load()
+
+    def add(self, fingerprint, verdict, seen=None):
+        if fingerprint not in self.entries:
+            for key in band_keys(fingerprint, self.bands):
+                self.buckets.setdefault(key, set()).add(fingerprint)
+        self.entries[fingerprint] = {"verdict": verdict, "seen": seen or datetime.now().date().isoformat()}
+
+    def nearest(self, fingerprint):
+        best, best_distance = None, self.max_distance + 1
+        for key in band_keys(fingerprint, self.bands):
+            for candidate in self.buckets.get(key, ()):
+                distance = hamming_distance(fingerprint, candidate)
+                if distance < best_distance:
+                    best, best_distance = candidate, distance
+        return best
+
+    def verdict_for(self, fingerprint):
+        """
+        Returns the stored verdict of a near-duplicate comment, or None if none was screened.
+        """
+        match = self.nearest(fingerprint)
+        if match is None:
+            return None
+        self.entries[match]["seen"] = datetime.now().date().isoformat()
+        return self.entries[match]["verdict"]
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                rows = json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error(f"Error loading comment fingerprints: {e}")
+            return
+        cutoff = (datetime.now() - timedelta(days=self.ttl_days)).date().isoformat()
+        for fingerprint, verdict, seen in rows:
+            if seen >= cutoff:
+                self.add(int(fingerprint, 16), verdict, seen)
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            rows = [[f"{fingerprint:016x}", entry["verdict"], entry["seen"]] for fingerprint, entry in self.entries.items()]
+            with open(self.path, 'w', encoding='utf-8') as file:
+                json.dump(rows, file)
+        except OSError as e:
+            logging.error(f"Error saving comment fingerprints: {e}")
+
+
+def group_comments(comments, max_distance=7):
+    """
+    Collapses near-duplicate comments into groups.
+    Each group keeps its most-liked member's text, the summed likes of every
+    member and its fingerprint. Groups are returned by summed likes, descending.
+    """
+    index = SimHashIndex(path=None, max_distance=max_distance)
+    groups = {}
+    for comment in sorted(comments, key=lambda x: x['likes'] or 0, reverse=True):
+        fingerprint = simhash(comment['text'])
+        match = index.nearest(fingerprint)
+        if match is None:
+            index.add(fingerprint, None)
+            groups[fingerprint] = {
+                'text': comment['text'],
+                'likes': 0,
+                'fingerprint': fingerprint,
+                'members': 0,
+            }
+            match = fingerprint
+        groups[match]['likes'] += comment['likes'] or 0
+        groups[match]['members'] += 1
+    return sorted(groups.values(), key=lambda x: x['likes'], reverse=True)
@@ -0,0 +1,134 @@
+# content_generators/comment_prefilter.py
+
+import json
+import logging
+import os
+import re
+import unicodedata
+from collections import Counter
+
+from nltk.tokenize import wordpunct_tokenize
+
+URL_PATTERN = re.compile(r'(https?://\S+|www\.\S+|\S+\.(com|org|net|io|app|social)\S*)', re.IGNORECASE)
+MENTION_PATTERN = re.compile(r'[@#]\S+')
+
+# Reactions that never give the story a direction on their own
+PRAISE_WORDS = {
+    "love", "loved", "loving", "like", "liked", "great", "good", "nice", "cool", "awesome", "amazing",
+    "wow", "omg", "lol", "lmao", "haha", "yes", "yay", "beautiful", "wonderful", "fantastic", "brilliant",
+    "excellent", "incredible", "epic", "fun", "interesting", "intriguing", "exciting", "fascinating",
+    "perfect", "best", "story", "stories", "post", "thread", "chapter", "part", "writing", "written",
+    "more", "next", "continue", "please", "wait", "waiting", "cant", "can't", "hooked", "thanks", "thank",
+    "following", "follow", "keep", "going", "up", "bravo", "congrats", "job", "work", "read", "can",
+}
+FILLER_WORDS = {
+    "a", "an", "the", "this", "that", "it", "its", "it's", "is", "was", "so", "very", "really", "much",
+    "i", "im", "i'm", "we", "you", "your", "my", "me", "to", "for", "of", "and", "oh", "just", "what",
+    "such", "too", "s", "t", "m", "be", "all", "already", "one", "on", "here", "there",
+}
+
+
+def is_emoji(char):
+    code = ord(char)
+    return (
+        unicodedata.category(char) == 'So'
+        or 0x1F000 <= code <= 0x1FAFF
+        or 0x2600 <= code <= 0x27BF
+        or code in (0x200D, 0xFE0F)
+    )
+
+
+class CommentPrefilter:
+    """
+    Cheap local cascade that rejects comments which are obviously not story
+    directions before any model sees them. Rules run in order and the first
+    one that fires rejects the comment; hits are counted per rule and the
+    running totals are kept in `stats_path`.
+    """
+    def __init__(self, min_chars=3, min_words=1, max_emoji_ratio=0.5, stats_path='logs/prefilter_stats.json'):
+        self.min_chars = min_chars
+        self.min_words = min_words
+        self.max_emoji_ratio = max_emoji_ratio
+        self.stats_path = stats_path
+        self.hits = Counter()
+        self.rules = [
+            ("url_only", self.is_url_only),
+            ("emoji", self.is_mostly_emoji),
+            ("too_short", self.is_too_short),
+            ("praise", self.is_praise),
+            ("repeats_post", self.repeats_post),
+        ]
+
+    def is_url_only(self, text, words, post_words):
+        stripped = MENTION_PATTERN.sub('', URL_PATTERN.sub('', text))
+        return bool(URL_PATTERN.search(text)) and not re.search(r'[^\W\d_]', stripped)
+
+    def is_too_short(self, text, words, post_words):
+        # Only catches comments with next to no text: short imperatives like "Kill Elena"
+        # are real directions, and short praise is left to the praise rule
+        return len(text.strip()) < self.min_chars or len(words) < self.min_words
+
+    def is_mostly_emoji(self, text, words, post_words):
+        chars = [char for char in text if not char.isspace()]
+        if not chars:
+            return True
+        return sum(1 for char in chars if is_emoji(char)) / len(chars) > self.max_emoji_ratio
+
+    def is_praise(self, text, words, post_words):
+        content = [word for word in words if word not in FILLER_WORDS]
+        return all(word in PRAISE_WORDS for word in content)
+
+    def repeats_post(self, text, words, post_words):
+        # Quoting the post back is not a direction, even if it is long enough
+        if not post_words:
+            return False
+        return sum(1 for word in words if word in post_words) / len(words) >= 0.9
+
+    def reject_reason(self, text, post_text=None):
+        """
+        Returns the name of the first rule that rejects the comment, or None if
+        the comment is ambiguous and has to go to the model.
+        """
+        text = text or ""
+        words = [token.lower() for token in wordpunct_tokenize(MENTION_PATTERN.sub('', URL_PATTERN.sub('', text)))
+                 if re.search(r'[^\W\d_]', token)]
+        post_words = {token.lower() for token in wordpunct_tokenize(post_text)} if post_text else set()
+        for name, rule in self.rules:
+            if rule(text, words, post_words):
+                return name
+        return None
+
+    def filter(self, comment_texts, post_text=None):
+        """
+        Returns the (index, text) pairs that survive the cascade, in their original order.
+        """
+        kept = []
+        for index, text in enumerate(comment_texts):
+            reason = self.reject_reason(text, post_text)
+            if reason:
+                self.hits[reason] += 1
+                logging.debug(f"Prefilter rejected comment ({reason}): {text}")
+            else:
+                kept.append((index, text))
+        self.hits["passed"] += len(kept)
+        return kept
+
+    def save_stats(self):
+        """
+        Adds this run's hits to the running totals on disk and resets them.
+        """
+        if not self.hits:
+            return
+        totals = Counter()
+        try:
+            if os.path.exists(self.stats_path):
+                with open(self.stats_path, 'r', encoding='utf-8') as file:
+                    totals.update(json.load(file))
+            totals.update(self.hits)
+            os.makedirs(os.path.dirname(self.stats_path) or '.', exist_ok=True)
+            with open(self.stats_path, 'w', encoding='utf-8') as file:
+                json.dump(dict(totals), file, indent=2)
+            logging.info(f"Prefilter hits this run: {dict(self.hits)}")
+            self.hits.clear()
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error(f"Error saving prefilter stats: {e}")
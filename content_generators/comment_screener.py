@@ -0,0 +1,40 @@
+# content_generators/comment_screener.py
+
+import asyncio
+import logging
+
+
+async def first_in_rank(items, check, max_concurrency=4):
+    """
+    Speculatively runs `check(item)` for the ranked items, at most
+    `max_concurrency` at a time, and returns the first non-None result in rank
+    order, i.e. exactly what a serial loop over `items` would return.
+
+    Checks are started highest rank first. As soon as an item passes and every
+    higher-ranked item has been decided, the outstanding lower-ranked checks are
+    cancelled. A check that raises counts as a rejection.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(item):
+        async with semaphore:
+            return await check(item)
+
+    tasks = [asyncio.create_task(run(item)) for item in items]
+    try:
+        # Awaiting in rank order means every earlier item is decided by the time we look at this one
+        for task in tasks:
+            try:
+                result = await task
+            except Exception as e:
+                logging.error(f"Error screening comments: {e}")
+                continue
+            if result is not None:
+                return result
+        return None
+    finally:
+        pending = [task for task in tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
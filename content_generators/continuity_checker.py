@@ -0,0 +1,88 @@
+# content_generators/continuity_checker.py
+
+import logging
+import re
+
+from .story_retrieval import tokenize
+
+ISSUE_MESSAGES = {
+    "repeats": "- The draft repeats content unnecessarily.",
+    "ignores_comment": "- The draft does not adequately incorporate the user comment.",
+    "stalls": "- The draft does not effectively advance the plot.",
+}
+
+
+def word_ngrams(text, n):
+    words = re.findall(r"[a-z0-9']+", (text or "").lower())
+    return {tuple(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+class ContinuityChecker:
+    """
+    Lexical checks of a candidate post against the month's story, with no model call:
+      - overlap: share of the candidate's word n-grams already in the story (verbatim repetition)
+      - coverage: share of the user comment's content words the candidate uses
+      - novelty: share of the candidate's content words the story hasn't used yet
+    The story's n-grams and vocabulary are kept as sets and only grow with new
+    posts, so a check costs as much as the candidate itself.
+    """
+    def __init__(self, n=4, max_overlap=0.35, min_comment_coverage=0.25, min_novelty=0.2):
+        self.n = n
+        self.max_overlap = max_overlap
+        self.min_comment_coverage = min_comment_coverage
+        self.min_novelty = min_novelty
+        self.reset()
+
+    def reset(self):
+        self.posts = []
+        self.shingles = set()
+        self.vocabulary = set()
+
+    def add(self, post):
+        self.posts.append(post)
+        self.shingles |= word_ngrams(post, self.n)
+        self.vocabulary.update(tokenize(post))
+
+    def sync(self, posts):
+        """
+        Adds the posts not seen yet; starts over if `posts` is a different story (e.g. a new month).
+        """
+        if posts[:len(self.posts)] != self.posts:
+            self.reset()
+        for post in posts[len(self.posts):]:
+            self.add(post)
+
+    def check(self, text, user_comment=None):
+        grams = word_ngrams(text, self.n)
+        overlap = len(grams & self.shingles) / len(grams) if grams else 0.0
+        words = set(tokenize(text))
+        novelty = len(words - self.vocabulary) / len(words) if words else 0.0
+        comment_words = set(tokenize(user_comment))
+        coverage = len(comment_words & words) / len(comment_words) if comment_words else 1.0
+
+        issues = []
+        if overlap > self.max_overlap:
+            issues.append("repeats")
+        if user_comment and coverage < self.min_comment_coverage:
+            issues.append("ignores_comment")
+        if self.posts and novelty < self.min_novelty:
+            issues.append("stalls")
+        return {'overlap': overlap, 'coverage': coverage, 'novelty': novelty, 'issues': issues}
+
+    def screen(self, candidates, user_comment=None):
+        """
+        Drops (name, text) candidates that repeat the story and orders the rest
+        by how many issues they have, stable otherwise. If every candidate
+        repeats, the one repeating least is kept so there is always something to post.
+        """
+        checked = [(candidate, self.check(candidate[1], user_comment)) for candidate in candidates]
+        kept = [(candidate, verdict) for candidate, verdict in checked if "repeats" not in verdict['issues']]
+        for (name, _), verdict in checked:
+            if verdict['issues']:
+                logging.info(f"{name} candidate issues {verdict['issues']} "
+                             f"(overlap {verdict['overlap']:.2f}, coverage {verdict['coverage']:.2f}, "
+                             f"novelty {verdict['novelty']:.2f})")
+        if not kept:
+            kept = [min(checked, key=lambda item: item[1]['overlap'])] if checked else []
+        kept.sort(key=lambda item: len(item[1]['issues']))
+        return [candidate for candidate, _ in kept]
@@ -0,0 +1,107 @@
+# content_generators/daemon.py
+
+import asyncio
+import logging
+import signal
+from datetime import datetime, timedelta
+
+
+def seconds_until(post_time, now=None):
+    """
+    Seconds from `now` until the next local "HH:MM".
+    """
+    now = now or datetime.now()
+    hour, minute = (int(part) for part in post_time.split(":"))
+    next_run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+def shift_time(post_time, minutes):
+    """
+    The local "HH:MM" `minutes` after `post_time` (before it if negative), wrapping around midnight.
+    """
+    hour, minute = (int(part) for part in post_time.split(":"))
+    total = (hour * 60 + minute + minutes) % (24 * 60)
+    return f"{total // 60:02d}:{total % 60:02d}"
+
+
+class DailyDaemon:
+    """
+    Long-running process that runs `job` every day at `post_time` on one event
+    loop, plus any background tasks, so clients, sessions and caches stay warm
+    between runs. More daily jobs, each at its own time, can be added with
+    `add_daily`. It sleeps until exactly the next due time instead of polling,
+    and on SIGTERM/SIGINT lets a running job finish (up to `shutdown_grace`
+    seconds) before stopping.
+    """
+    def __init__(self, job=None, post_time="09:00", shutdown_grace=25):
+        self.shutdown_grace = shutdown_grace
+        self.daily = []
+        self.background = []
+        self.stop_event = None
+        if job is not None:
+            self.add_daily(job, post_time)
+
+    def add_daily(self, job, post_time):
+        """
+        Runs `await job()` every day at `post_time` (local "HH:MM").
+        """
+        self.daily.append((job, post_time))
+
+    def add_background(self, task, next_delay):
+        """
+        Runs `await task()` repeatedly; `next_delay()` returns the seconds to sleep before each run.
+        """
+        self.background.append((task, next_delay))
+
+    async def sleep(self, seconds):
+        """
+        Sleeps for `seconds` or until shutdown. Returns True if the daemon is stopping.
+        """
+        try:
+            await asyncio.wait_for(self.stop_event.wait(), timeout=max(seconds, 0))
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def run_daily(self, job, post_time):
+        while True:
+            delay = seconds_until(post_time)
+            logging.info(f"Next job in {delay / 3600:.2f} hours.")
+            if await self.sleep(delay):
+                return
+            try:
+                await job()
+            except Exception as e:
+                logging.error(f"Error running daily job: {e}")
+
+    async def run_periodic(self, task, next_delay):
+        while True:
+            if await self.sleep(next_delay()):
+                return
+            try:
+                await task()
+            except Exception as e:
+                logging.error(f"Error running background task {getattr(task, '__name__', task)}: {e}")
+
+    async def run(self):
+        self.stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.stop_event.set)
+            except NotImplementedError:
+                # Windows event loops have no signal handlers; Ctrl+C still raises KeyboardInterrupt
+                pass
+
+        tasks = [asyncio.create_task(self.run_daily(job, post_time)) for job, post_time in self.daily]
+        tasks += [asyncio.create_task(self.run_periodic(task, next_delay)) for task, next_delay in self.background]
+
+        await self.stop_event.wait()
+        logging.info("Shutting down; waiting for running work to finish.")
+        done, pending = await asyncio.wait(tasks, timeout=self.shutdown_grace)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,141 @@
+# content_generators/engagement_scheduler.py
+
+import asyncio
+import json
+import logging
+import os
+import time
+
+# How long after posting each engagement measurement is taken
+CHECKPOINTS = [("1h", 3600), ("6h", 6 * 3600), ("24h", 24 * 3600)]
+
+# app.bsky.feed.getPosts accepts at most 25 URIs per call
+GET_POSTS_LIMIT = 25
+
+# Checkpoints whose batch failed are retried after RETRY_DELAY seconds, doubling
+# with each failure up to RETRY_MAX_DELAY, and dropped after MAX_FAILURES
+RETRY_DELAY = 60
+RETRY_MAX_DELAY = 3600
+MAX_FAILURES = 6
+
+
+class EngagementScheduler:
+    """
+    Queue of engagement checkpoints for posts we made, kept in `queue_path` so
+    checkpoints survive between runs. Posting only enqueues; `run_due` later
+    resolves every due checkpoint with bulk get_posts calls of up to 25 URIs.
+    """
+    def __init__(self, client, queue_path='logs/engagement_queue.json', checkpoints=CHECKPOINTS):
+        self.client = client
+        self.queue_path = queue_path
+        self.checkpoints = checkpoints
+        self.queue = self.load()
+
+    def load(self):
+        if not os.path.exists(self.queue_path):
+            return []
+        try:
+            with open(self.queue_path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error(f"Error loading engagement queue: {e}")
+            return []
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.queue_path) or '.', exist_ok=True)
+            tmp_path = self.queue_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(self.queue, file)
+            os.replace(tmp_path, self.queue_path)
+        except OSError as e:
+            logging.error(f"Error saving engagement queue: {e}")
+
+    def schedule(self, post_uri, text, posted_at=None, phase=None):
+        """
+        Queues every checkpoint for a post that was just made.
+        """
+        posted_at = posted_at or time.time()
+        for label, delay in self.checkpoints:
+            self.queue.append({
+                'uri': post_uri,
+                'text': text,
+                'checkpoint': label,
+                'posted_at': posted_at,
+                'phase': phase,
+                'due_at': posted_at + delay,
+            })
+        self.save()
+
+    def next_due_at(self):
+        return min((entry['due_at'] for entry in self.queue), default=None)
+
+    async def run_due(self, on_snapshot, now=None):
+        """
+        Measures every checkpoint that is due and calls `on_snapshot(snapshot)` for each.
+        A snapshot has the queue entry's fields plus likes, reposts, replies and quotes.
+        Checkpoints whose batch failed are retried later with exponential backoff,
+        and dropped once they have failed MAX_FAILURES times.
+        Returns the number of snapshots taken.
+        """
+        now = now or time.time()
+        due = [entry for entry in self.queue if entry['due_at'] <= now]
+        if not due:
+            return 0
+
+        uris = list(dict.fromkeys(entry['uri'] for entry in due))
+        batches = [uris[i:i + GET_POSTS_LIMIT] for i in range(0, len(uris), GET_POSTS_LIMIT)]
+        # The atproto client is synchronous, so keep its calls off the event loop
+        results = await asyncio.gather(
+            *(asyncio.to_thread(self.client.get_posts, uris=batch) for batch in batches),
+            return_exceptions=True
+        )
+
+        views = {}
+        measured = set()
+        for batch, result in zip(batches, results):
+            if isinstance(result, Exception):
+                logging.error(f"Error fetching engagement for {len(batch)} posts: {result}")
+                continue
+            measured.update(batch)
+            for post in result.posts:
+                views[post.uri] = post
+
+        due_ids = {id(entry) for entry in due}
+        taken = 0
+        remaining = []
+        for entry in self.queue:
+            if id(entry) not in due_ids:
+                remaining.append(entry)
+                continue
+            if entry['uri'] not in measured:
+                failures = entry.get('failures', 0) + 1
+                if failures >= MAX_FAILURES:
+                    logging.error(f"Dropping {entry['checkpoint']} checkpoint of {entry['uri']} "
+                                  f"after {failures} failed fetches.")
+                    continue
+                entry['failures'] = failures
+                entry['due_at'] = now + min(RETRY_DELAY * 2 ** (failures - 1), RETRY_MAX_DELAY)
+                remaining.append(entry)
+                continue
+            post = views.get(entry['uri'])
+            if post is None:
+                # Deleted posts are no longer returned; drop their checkpoints
+                continue
+            snapshot = dict(entry)
+            snapshot.update({
+                'likes': post.like_count or 0,
+                'reposts': post.repost_count or 0,
+                'replies': post.reply_count or 0,
+                'quotes': getattr(post, 'quote_count', 0) or 0,
+                'measured_at': now,
+            })
+            try:
+                on_snapshot(snapshot)
+            except Exception as e:
+                logging.error(f"Error recording engagement snapshot: {e}")
+            taken += 1
+
+        self.queue = remaining
+        self.save()
+        return taken
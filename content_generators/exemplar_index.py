@@ -0,0 +1,137 @@
+# content_generators/exemplar_index.py
+
+import heapq
+import json
+import logging
+import os
+
+# Posts need at least this reward to count as exemplars
+REWARD_THRESHOLD = 10
+
+
+class TopK:
+    """
+    The `k` highest-reward posts, as an indexed min-heap of [reward, uri, text].
+    The weakest entry sits at the root, so a new post that beats it replaces it
+    in O(log k), and a post whose reward changes is sifted in place in O(log k).
+    """
+    def __init__(self, k, entries=()):
+        self.k = k
+        self.heap = []
+        self.positions = {}
+        for reward, uri, text in entries:
+            self.update(uri, text, reward)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def _swap(self, i, j):
+        self.heap[i], self.heap[j] = self.heap[j], self.heap[i]
+        self.positions[self.heap[i][1]] = i
+        self.positions[self.heap[j][1]] = j
+
+    def _sift_up(self, i):
+        while i > 0:
+            parent = (i - 1) // 2
+            if self.heap[parent][0] <= self.heap[i][0]:
+                break
+            self._swap(i, parent)
+            i = parent
+
+    def _sift_down(self, i):
+        size = len(self.heap)
+        while True:
+            smallest = i
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < size and self.heap[child][0] < self.heap[smallest][0]:
+                    smallest = child
+            if smallest == i:
+                return
+            self._swap(i, smallest)
+            i = smallest
+
+    def update(self, uri, text, reward):
+        """
+        Adds or re-scores a post. Returns True if it is (still) in the top k.
+        """
+        if uri in self.positions:
+            i = self.positions[uri]
+            old_reward = self.heap[i][0]
+            self.heap[i][0] = reward
+            if reward < old_reward:
+                self._sift_up(i)
+            else:
+                self._sift_down(i)
+            return True
+        if len(self.heap) < self.k:
+            self.heap.append([reward, uri, text])
+            self.positions[uri] = len(self.heap) - 1
+            self._sift_up(len(self.heap) - 1)
+            return True
+        if reward <= self.heap[0][0]:
+            return False
+        del self.positions[self.heap[0][1]]
+        self.heap[0] = [reward, uri, text]
+        self.positions[uri] = 0
+        self._sift_down(0)
+        return True
+
+    def best(self, n):
+        """
+        The `n` best entries, highest reward first.
+        """
+        return heapq.nlargest(n, self.heap, key=lambda entry: entry[0])
+
+
+class ExemplarIndex:
+    """
+    Per-phase top-K of a story's posts by reward, kept in `path`.
+    Generation reads a fixed number of exemplars per phase, so the prompt
+    stays the same size however many posts qualify.
+    """
+    def __init__(self, path='logs/exemplars.json', k=20, min_reward=REWARD_THRESHOLD):
+        self.path = path
+        self.k = k
+        self.min_reward = min_reward
+        self.phases = self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            return {phase: TopK(self.k, entries) for phase, entries in data.items()}
+        except (OSError, ValueError) as e:
+            logging.error(f"Error loading exemplar index: {e}")
+            return {}
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump({phase: top.heap for phase, top in self.phases.items()}, file)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.error(f"Error saving exemplar index: {e}")
+
+    def update(self, phase, uri, text, reward):
+        """
+        Offers a measured post to its phase's top-K. Returns True if it made the cut.
+        """
+        if not phase or (reward < self.min_reward and uri not in self.phases.get(phase, TopK(0)).positions):
+            return False
+        top = self.phases.setdefault(phase, TopK(self.k))
+        return top.update(uri, text, reward)
+
+    def best(self, phase, n=3):
+        """
+        Texts of the `n` best posts of a phase, highest reward first.
+        """
+        top = self.phases.get(phase)
+        if not top:
+            return []
+        return [text for _, _, text in top.best(n)]
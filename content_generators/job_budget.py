@@ -0,0 +1,122 @@
+# content_generators/job_budget.py
+
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+# Whole daily job, in seconds
+DEFAULT_JOB_BUDGET = 240
+
+# Longest each stage may run. Safety and posting always get their full allowance;
+# the other stages only get what is left after reserving time for those two.
+STAGE_ALLOWANCES = {
+    "feed": 30,
+    "summary": 30,
+    "comments": 30,
+    "screening": 60,
+    "generation": 60,
+    "review": 20,
+    "safety": 20,
+    "post": 30,
+}
+PROTECTED_STAGES = ("safety", "post")
+
+# Degradations in the order they kick in, with the remaining budget (seconds)
+# below which each one fires. Once fired, a degradation stays on for the job.
+DEGRADATIONS = [
+    ("fewer_comments", 180),
+    ("single_provider", 140),
+    ("skip_reviewer", 90),
+]
+
+
+class JobBudget:
+    """
+    End-to-end deadline for one daily job, split into per-stage allowances.
+    `run` bounds a stage by its allowance and returns a fallback if it runs
+    over; `degrade` tells a stage whether to do less because the budget is
+    running low. Everything that fired is kept for `report`.
+    """
+    def __init__(self, total=DEFAULT_JOB_BUDGET, allowances=STAGE_ALLOWANCES, degradations=DEGRADATIONS):
+        self.total = total
+        self.allowances = allowances
+        self.thresholds = dict(degradations)
+        self.start = time.monotonic()
+        self.stages = {}
+        self.fired = []
+
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+    def remaining(self):
+        return max(self.total - self.elapsed(), 0)
+
+    def allowance(self, stage):
+        """
+        Seconds `stage` may take right now.
+        """
+        if stage in PROTECTED_STAGES:
+            return self.allowances[stage]
+        reserved = sum(self.allowances[name] for name in PROTECTED_STAGES)
+        return max(min(self.allowances[stage], self.remaining() - reserved), 0)
+
+    def record(self, name, detail=None):
+        if self.active(name):
+            return
+        self.fired.append({'name': name, 'at': round(self.elapsed(), 2), 'detail': detail})
+        logging.error(f"Job budget: {name} ({self.remaining():.0f}s of {self.total}s left)"
+                      + (f": {detail}" if detail else ""))
+
+    def active(self, name):
+        """
+        True if the degradation `name` has already fired.
+        """
+        return any(fired['name'] == name for fired in self.fired)
+
+    def degrade(self, name):
+        """
+        True if the degradation `name` is (or now becomes) active.
+        """
+        if self.active(name):
+            return True
+        if self.remaining() < self.thresholds[name]:
+            self.record(name)
+            return True
+        return False
+
+    async def run(self, stage, awaitable, fallback=None):
+        """
+        Awaits `awaitable` for at most the stage's allowance.
+        On timeout returns `fallback` (called first if it is callable).
+        """
+        start = time.monotonic()
+        try:
+            return await asyncio.wait_for(awaitable, timeout=self.allowance(stage))
+        except asyncio.TimeoutError:
+            self.record(f"{stage}_timeout")
+            return fallback() if callable(fallback) else fallback
+        finally:
+            self.stages[stage] = self.stages.get(stage, 0) + round(time.monotonic() - start, 3)
+
+    def report(self):
+        return {
+            'finished_at': datetime.now().isoformat(),
+            'elapsed': round(self.elapsed(), 2),
+            'budget': self.total,
+            'stages': self.stages,
+            'degradations': self.fired,
+        }
+
+    def save(self, path):
+        """
+        Appends this job's report to a JSON Lines file.
+        """
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(self.report()) + "\n")
+        except OSError as e:
+            logging.error(f"Error saving job budget report: {e}")
@@ -0,0 +1,104 @@
+# content_generators/llm_cache.py
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+
+
+class SQLiteLLMCache(BaseCache):
+    """
+    On-disk LLM response cache shared by every run of the bot.
+    Entries are keyed by a hash of the model string (model name and call
+    parameters) and the prompt, expire after `ttl_seconds`, and the least
+    recently used entries are evicted once there are more than `max_entries`.
+
+    Pass it to a langchain model with `cache=...`; only use it on models whose
+    answers should be reused, i.e. the checks and the reviewer.
+    """
+    def __init__(self, db_path='logs/llm_cache.sqlite3', ttl_seconds=7 * 24 * 3600, max_entries=5000):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # langchain calls the cache from executor threads for async models
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        # WAL with relaxed syncing keeps the last_access bookkeeping cheap on every hit
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_access ON llm_cache (last_access)")
+            self.conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            self.count = self.conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    @staticmethod
+    def make_key(prompt, llm_string):
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode('utf-8')).hexdigest()
+
+    def lookup(self, prompt, llm_string):
+        key = self.make_key(prompt, llm_string)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            with self.conn:
+                if created_at < now - self.ttl_seconds:
+                    self.conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self.count -= 1
+                    return None
+                self.conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+        try:
+            return loads(value)
+        except Exception as e:
+            logging.error(f"Error loading cached LLM response: {e}")
+            return None
+
+    def update(self, prompt, llm_string, return_val):
+        key = self.make_key(prompt, llm_string)
+        now = time.time()
+        try:
+            value = dumps(return_val)
+        except Exception as e:
+            logging.error(f"Error serializing LLM response for the cache: {e}")
+            return
+        with self.lock, self.conn:
+            exists = self.conn.execute("SELECT 1 FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            if not exists:
+                self.count += 1
+            if self.count > self.max_entries:
+                self.evict()
+
+    def evict(self):
+        # Drop the least recently used entries down to the size bound (caller holds the lock)
+        excess = self.count - self.max_entries
+        self.conn.execute(
+            "DELETE FROM llm_cache WHERE key IN "
+            "(SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?)",
+            (excess,)
+        )
+        self.count -= excess
+
+    def clear(self, **kwargs):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM llm_cache")
+            self.count = 0
@@ -0,0 +1,211 @@
+# content_generators/metrics_store.py
+
+import csv
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+POST_COLUMNS = ['uri', 'story', 'month', 'phase', 'posted_at', 'text', 'checkpoint', 'likes', 'reposts', 'replies',
+                'quotes', 'reward', 'measured_at']
+
+
+class MetricsStore:
+    """
+    Append-only store of our posts and their engagement snapshots (SQLite, WAL).
+    Each post row also carries its latest snapshot and reward, indexed by month,
+    phase and reward, so questions like "top 20 climax posts by reward" are an
+    index range scan instead of a pass over the whole history.
+    """
+    def __init__(self, db_path='logs/metrics.sqlite3'):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS posts ("
+                "uri TEXT PRIMARY KEY, story TEXT, month TEXT NOT NULL, phase TEXT, "
+                "posted_at REAL NOT NULL, text TEXT NOT NULL, checkpoint TEXT, "
+                "likes INTEGER, reposts INTEGER, replies INTEGER, quotes INTEGER, "
+                "reward REAL, measured_at REAL)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots ("
+                "id INTEGER PRIMARY KEY, uri TEXT NOT NULL, checkpoint TEXT NOT NULL, "
+                "measured_at REAL NOT NULL, likes INTEGER NOT NULL, reposts INTEGER NOT NULL, "
+                "replies INTEGER NOT NULL, quotes INTEGER NOT NULL, reward REAL NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS posts_month ON posts (month, posted_at)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS posts_phase_reward ON posts (phase, reward DESC)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS posts_reward ON posts (reward DESC)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS posts_story_month ON posts (story, month)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS snapshots_uri ON snapshots (uri, measured_at)")
+
+    def add_post(self, uri, text, phase=None, story=None, posted_at=None):
+        posted_at = posted_at or time.time()
+        month = datetime.fromtimestamp(posted_at, timezone.utc).strftime("%Y-%m")
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO posts (uri, story, month, phase, posted_at, text) VALUES (?, ?, ?, ?, ?, ?)",
+                (uri, story, month, phase, posted_at, text)
+            )
+
+    def add_snapshots(self, snapshots, story=None):
+        """
+        Stores a batch of engagement snapshots in one transaction and moves each
+        post's latest reward forward. A snapshot has uri, text, posted_at,
+        checkpoint, measured_at, likes, reposts, replies, quotes and reward.
+        """
+        if not snapshots:
+            return
+        snapshots = sorted(snapshots, key=lambda snapshot: snapshot['measured_at'])
+        with self.lock, self.conn:
+            # Posts made before the store existed only get a row here
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO posts (uri, story, month, phase, posted_at, text) VALUES (?, ?, ?, ?, ?, ?)",
+                [(s['uri'], story, datetime.fromtimestamp(s['posted_at'], timezone.utc).strftime("%Y-%m"),
+                  s.get('phase'), s['posted_at'], s['text']) for s in snapshots]
+            )
+            self.conn.executemany(
+                "INSERT INTO snapshots (uri, checkpoint, measured_at, likes, reposts, replies, quotes, reward) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(s['uri'], s['checkpoint'], s['measured_at'], s['likes'], s['reposts'], s['replies'],
+                  s.get('quotes', 0), s['reward']) for s in snapshots]
+            )
+            self.conn.executemany(
+                "UPDATE posts SET checkpoint = ?, likes = ?, reposts = ?, replies = ?, quotes = ?, reward = ?, "
+                "measured_at = ? WHERE uri = ? AND (measured_at IS NULL OR measured_at <= ?)",
+                [(s['checkpoint'], s['likes'], s['reposts'], s['replies'], s.get('quotes', 0), s['reward'],
+                  s['measured_at'], s['uri'], s['measured_at']) for s in snapshots]
+            )
+
+    def top_posts(self, limit=20, phase=None, month=None, story=None, min_reward=None):
+        """
+        Posts with the highest latest reward, best first, as dicts.
+        """
+        clauses = ["reward IS NOT NULL"]
+        params = []
+        for column, value in (("phase", phase), ("month", month), ("story", story)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if min_reward is not None:
+            clauses.append("reward >= ?")
+            params.append(min_reward)
+        query = (f"SELECT {', '.join(POST_COLUMNS)} FROM posts WHERE {' AND '.join(clauses)} "
+                 f"ORDER BY reward DESC LIMIT ?")
+        with self.lock:
+            rows = self.conn.execute(query, params + [limit]).fetchall()
+        return [dict(zip(POST_COLUMNS, row)) for row in rows]
+
+    def snapshots_for(self, uri):
+        """
+        Every snapshot of a post, oldest first.
+        """
+        columns = ['checkpoint', 'measured_at', 'likes', 'reposts', 'replies', 'quotes', 'reward']
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {', '.join(columns)} FROM snapshots WHERE uri = ? ORDER BY measured_at", (uri,)
+            ).fetchall()
+        return [dict(zip(columns, row)) for row in rows]
+
+    def iter_posts(self, month=None, story=None, batch_size=500):
+        """
+        Yields posts (with their latest snapshot) oldest first, `batch_size` rows at a time.
+        """
+        clauses = []
+        params = []
+        for column, value in (("month", month), ("story", story)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        # A separate read connection, so a long export doesn't hold the writer's lock
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.execute(f"SELECT {', '.join(POST_COLUMNS)} FROM posts {where}ORDER BY posted_at", params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(zip(POST_COLUMNS, row))
+        finally:
+            conn.close()
+
+    def export_csv(self, file, month=None, story=None):
+        """
+        Streams posts to an open text file as CSV. Returns the number of rows written.
+        """
+        writer = csv.DictWriter(file, fieldnames=POST_COLUMNS)
+        writer.writeheader()
+        count = 0
+        for post in self.iter_posts(month=month, story=story):
+            writer.writerow(post)
+            count += 1
+        return count
+
+    def export_jsonl(self, file, month=None, story=None):
+        """
+        Streams posts to an open text file as JSON Lines. Returns the number of rows written.
+        """
+        count = 0
+        for post in self.iter_posts(month=month, story=story):
+            file.write(json.dumps(post, ensure_ascii=False) + "\n")
+            count += 1
+        return count
+
+    def import_tweet_logs(self, csv_path, story=None):
+        """
+        Loads a legacy tweet_logs.csv (one row per measurement) as snapshots.
+        Rows that can't be parsed are skipped. Returns the number imported.
+        """
+        snapshots = []
+        try:
+            with open(csv_path, 'r', newline='', encoding='utf-8') as file:
+                for row in csv.DictReader(file):
+                    try:
+                        measured_at = datetime.fromisoformat(row['Timestamp']).timestamp()
+                        snapshots.append({
+                            'uri': row['URI'],
+                            'text': row['Tweet'],
+                            'posted_at': measured_at,
+                            'checkpoint': 'legacy',
+                            'measured_at': measured_at,
+                            'likes': int(float(row['Likes'] or 0)),
+                            'reposts': int(float(row['Retweets'] or 0)),
+                            'replies': int(float(row['Comments'] or 0)),
+                            'reward': float(row['Reward'] or 0),
+                        })
+                    except (KeyError, TypeError, ValueError) as e:
+                        logging.error(f"Skipping unreadable row in {csv_path}: {e}")
+        except OSError as e:
+            logging.error(f"Error importing {csv_path}: {e}")
+            return 0
+        self.add_snapshots(snapshots, story=story)
+        return len(snapshots)
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Export the post metrics store.")
+    parser.add_argument("--db", default='logs/metrics.sqlite3')
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="csv")
+    parser.add_argument("--month", help="Only this month (YYYY-MM).")
+    parser.add_argument("--story", help="Only this story.")
+    args = parser.parse_args()
+
+    store = MetricsStore(args.db)
+    export = store.export_csv if args.format == "csv" else store.export_jsonl
+    export(sys.stdout, month=args.month, story=args.story)
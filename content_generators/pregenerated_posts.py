@@ -0,0 +1,91 @@
+# content_generators/pregenerated_posts.py
+
+import json
+import logging
+import os
+import time
+
+# Prepared posts older than this (seconds) are not used
+MAX_AGE = 6 * 3600
+
+
+class PregeneratedPosts:
+    """
+    Posts generated ahead of a story's posting slot, kept in `path` so a restart
+    between preparing and posting doesn't lose them. There is one entry per slot:
+    the post they continue, the phase, the leading comment at preparation time,
+    and a ready post for each branch ("none" continues without a comment,
+    "comment" follows the leading comment) with why it counts as safe.
+    """
+    def __init__(self, path='logs/pregenerated.json', max_age=MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            logging.error(f"Error loading pregenerated posts: {e}")
+            return None
+
+    def save(self, entry):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(entry, file)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.error(f"Error saving pregenerated posts: {e}")
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            try:
+                os.remove(self.path)
+            except OSError as e:
+                logging.error(f"Error clearing pregenerated posts: {e}")
+
+    def put(self, last_post_id, phase, comment, posts):
+        """
+        Stores the posts prepared for the next slot. `posts` maps a branch
+        ("none" or "comment") to (text, approval).
+        """
+        self.save({
+            'last_post_id': last_post_id,
+            'phase': phase,
+            'comment': comment,
+            'prepared_at': time.time(),
+            'posts': {branch: {'text': text, 'approval': approval} for branch, (text, approval) in posts.items()},
+        })
+
+    def take(self, last_post_id, phase, comment, keep=False):
+        """
+        The prepared (text, approval) for this slot and comment, or None if the
+        story moved on, the phase changed, the entry is stale or the leading
+        comment is not the one the posts were prepared for. A prepared post is
+        only handed out once, unless `keep` is set (dry runs).
+        """
+        entry = self.load()
+        if not entry:
+            return None
+        if (entry.get('last_post_id') != last_post_id or entry.get('phase') != phase
+                or time.time() - entry.get('prepared_at', 0) > self.max_age):
+            return None
+        if comment is None:
+            branch = 'none'
+        elif comment == entry.get('comment'):
+            branch = 'comment'
+        else:
+            logging.info("Leading comment changed since the posts were prepared.")
+            return None
+        post = entry.get('posts', {}).get(branch)
+        if not post:
+            return None
+        if not keep:
+            self.clear()
+        return post['text'], post.get('approval')
@@ -0,0 +1,250 @@
+# content_generators/provider_fanout.py
+
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from collections import deque
+
+from langchain_core.output_parsers import StrOutputParser
+
+
+# Seconds after which a provider is hedged until it has enough latency samples of its own
+DEFAULT_HEDGE_AFTER = 15
+
+
+class LatencyTracker:
+    """
+    Recent generation latencies per provider, used to decide when to hedge.
+    A story only adds a sample or two per provider a day, so the samples are
+    kept in `path` and carry over restarts; until a provider has `min_samples`,
+    `default` seconds stands in for its percentiles.
+    """
+    def __init__(self, window=50, min_samples=5, path=None, default=DEFAULT_HEDGE_AFTER):
+        self.window = window
+        self.min_samples = min_samples
+        self.path = path
+        self.default = default
+        self.samples = self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            return {name: deque(samples, maxlen=self.window) for name, samples in data.items()}
+        except (OSError, ValueError) as e:
+            logging.error(f"Error loading provider latencies: {e}")
+            return {}
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump({name: list(samples) for name, samples in self.samples.items()}, file)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.error(f"Error saving provider latencies: {e}")
+
+    def record(self, name, seconds):
+        self.samples.setdefault(name, deque(maxlen=self.window)).append(round(seconds, 3))
+        self.save()
+
+    def percentile(self, name, q):
+        """
+        The `q` quantile (0-1) of the provider's recent latencies, or `default` until there are enough samples.
+        """
+        samples = sorted(self.samples.get(name, ()))
+        if len(samples) < self.min_samples:
+            return self.default
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+
+# Shared by every fan-out in the process, so all stories learn from each other's calls
+latency_tracker = LatencyTracker(path=os.path.join('logs', 'provider_latency.json'))
+
+
+class Provider:
+    """
+    A named chat model taking part in competing generations.
+    `timeout` bounds how long a single generation may run (in seconds).
+    `limit` is an optional asyncio.Semaphore capping concurrent calls to the
+    provider; stories running in one process share it so they share the rate limit.
+    `guard` is an optional ProviderGuard (rate limit, retries, circuit breaker).
+    `backup` is an optional Provider that gets the same prompt when this one fails
+    or runs past its `hedge_percentile` latency; whichever answers first is used.
+    """
+    def __init__(self, name, llm, timeout=45, limit=None, guard=None, backup=None, hedge_percentile=0.9):
+        self.name = name
+        self.llm = llm
+        self.timeout = timeout
+        self.limit = limit
+        self.guard = guard
+        self.backup = backup
+        self.hedge_percentile = hedge_percentile
+
+    def __repr__(self):
+        return f"Provider({self.name!r})"
+
+
+# A streamed generation also stops once a sentence ends past this share of `max_chars`
+STREAM_STOP_RATIO = 0.85
+
+
+async def stream_until(chain, max_chars, stop_ratio=STREAM_STOP_RATIO):
+    """
+    Streams `chain` and stops as soon as the text is as long as it can usefully
+    get: past `max_chars`, or at the end of a sentence close to it. Closing the
+    stream early saves the time and tokens the rest of the answer would cost.
+    """
+    text = ""
+    stream = chain.astream({})
+    try:
+        async for chunk in stream:
+            text += chunk
+            if len(text) > max_chars:
+                break
+            if len(text) >= max_chars * stop_ratio and re.search(r'[.!?]["\')\]]?\s*$', text):
+                break
+    finally:
+        await stream.aclose()
+    return text
+
+
+async def _generate(provider, prompt, max_chars=None):
+    if provider.limit is not None:
+        async with provider.limit:
+            return await _invoke(provider, prompt, max_chars)
+    return await _invoke(provider, prompt, max_chars)
+
+
+async def _invoke(provider, prompt, max_chars=None):
+    chain = prompt | provider.llm | StrOutputParser()
+    start = time.monotonic()
+    if max_chars:
+        run, args, kwargs = stream_until, (chain, max_chars), {}
+    else:
+        run, args, kwargs = chain.ainvoke, (), {'input': {}}
+    call = provider.guard.call(run, *args, **kwargs) if provider.guard else run(*args, **kwargs)
+    text = await asyncio.wait_for(call, timeout=provider.timeout)
+    latency_tracker.record(provider.name, time.monotonic() - start)
+    logging.debug(f"{provider.name} generated in {time.monotonic() - start:.2f}s: {text}")
+    return text
+
+
+def _usable(task):
+    return task.done() and not task.cancelled() and task.exception() is None and bool((task.result() or "").strip())
+
+
+async def _cancel(tasks):
+    for task in tasks:
+        if not task.done():
+            task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _generate_hedged(provider, prompt, max_chars=None):
+    """
+    Generates with `provider`, racing its backup once the provider fails or is
+    slower than usual. The loser is cancelled.
+    """
+    primary = asyncio.create_task(_generate(provider, prompt, max_chars))
+    if provider.backup is None:
+        return await primary
+
+    racers = [primary]
+    try:
+        hedge_after = latency_tracker.percentile(provider.name, provider.hedge_percentile)
+        done, _ = await asyncio.wait(racers, timeout=hedge_after)
+        if _usable(primary):
+            return primary.result()
+        if done:
+            logging.error(f"{provider.name} generation failed ({primary.exception() or 'empty response'}); "
+                          f"falling back to {provider.backup.name}.")
+        else:
+            logging.info(f"{provider.name} is past its p{provider.hedge_percentile * 100:.0f} latency "
+                         f"({hedge_after:.1f}s); hedging with {provider.backup.name}.")
+        racers.append(asyncio.create_task(_generate(provider.backup, prompt, max_chars)))
+
+        pending = [task for task in racers if not task.done()]
+        while pending:
+            _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in racers:
+                if _usable(task):
+                    return task.result()
+        # Neither answered; surface the primary's error
+        return primary.result()
+    finally:
+        await _cancel(racers)
+
+
+async def fan_out(prompt, providers, deadline=None, soft_deadline=None, max_chars=None, on_candidate=None):
+    """
+    Issue the prompt to every provider at once.
+    Returns a list of (provider_name, text) for the generations that finished
+    in time, in provider order. Until `soft_deadline` every provider is waited
+    for; after it the fan-out returns as soon as one candidate is ready.
+    `deadline` is the hard limit.
+    With `max_chars`, generations are streamed and cut off near that length.
+    `on_candidate(name, text)` is called as each generation finishes, so later
+    stages can start on the first candidate while the others are still running.
+    """
+    tasks = {asyncio.create_task(_generate_hedged(provider, prompt, max_chars)): provider for provider in providers}
+    if not tasks:
+        return []
+
+    # Set once fan_out returns (or is cancelled), so no candidate is reported after that
+    closed = []
+    if on_candidate is not None:
+        def notify(task, name):
+            if _usable(task) and not closed:
+                try:
+                    on_candidate(name, task.result())
+                except Exception as e:
+                    logging.error(f"Error handling {name} candidate: {e}")
+        for task, provider in tasks.items():
+            task.add_done_callback(lambda task, name=provider.name: notify(task, name))
+
+    start = time.monotonic()
+    try:
+        done, pending = await asyncio.wait(tasks, timeout=soft_deadline if soft_deadline is not None else deadline)
+        while pending and soft_deadline is not None and not any(_usable(task) for task in done):
+            remaining = None if deadline is None else deadline - (time.monotonic() - start)
+            if remaining is not None and remaining <= 0:
+                break
+            finished, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            done |= finished
+
+        for task in pending:
+            if soft_deadline is not None and any(_usable(other) for other in done):
+                logging.info(f"{tasks[task].name} generation still running after the {soft_deadline}s soft deadline. "
+                             f"Cancelling.")
+            else:
+                logging.error(f"{tasks[task].name} generation missed the {deadline}s deadline. Cancelling.")
+    finally:
+        # Also runs when the caller cancels the fan-out (e.g. a JobBudget stage timing out),
+        # so no generation outlives it
+        closed.append(True)
+        await _cancel(list(tasks))
+
+    candidates = []
+    for task, provider in tasks.items():
+        if task not in done:
+            continue
+        try:
+            text = task.result()
+        except asyncio.TimeoutError:
+            logging.error(f"{provider.name} generation timed out after {provider.timeout}s")
+            continue
+        except Exception as e:
+            logging.error(f"Error generating {provider.name} post: {e}")
+            continue
+        if text and text.strip():
+            candidates.append((provider.name, text))
+    return candidates
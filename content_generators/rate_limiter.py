@@ -0,0 +1,276 @@
+# content_generators/rate_limiter.py
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from tenacity import AsyncRetrying, Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+# Sustained requests per second and burst size for each provider/endpoint.
+# Kept below the published limits so a full run of every story never gets a 429:
+# OpenAI gpt-4 500 RPM, Anthropic 50 RPM, Bluesky 3000 requests per 5 minutes,
+# 5000 write points per hour (a post costs 3) and 30 logins per 5 minutes.
+DEFAULT_LIMITS = {
+    "openai": (6.0, 10),
+    "anthropic": (0.75, 4),
+    "bluesky.read": (8.0, 20),
+    "bluesky.write": (0.4, 5),
+    # Password logins (createSession) are limited to 30 per 5 minutes
+    "bluesky.session": (0.05, 3),
+}
+
+# Guard settings that differ from ProviderGuard's defaults. Writes are never
+# retried: a post that timed out or got a 5xx may already be committed, and
+# sending it again would publish it twice.
+GUARD_OPTIONS = {
+    "bluesky.write": {"attempts": 1},
+}
+
+# Status codes worth retrying: the provider is busy or briefly unavailable
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a provider whose circuit breaker is open.
+    """
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens per second, holding at most `capacity`.
+    Each caller reserves its token up front and sleeps until it is due, so waiters
+    are served in order. Safe to share between the event loop and worker threads.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """
+        Takes `tokens` and returns the seconds to wait before using them.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+            return max(-self.tokens / self.rate, 0)
+
+    def acquire(self, tokens=1):
+        delay = self.reserve(tokens)
+        if delay:
+            time.sleep(delay)
+
+    async def aacquire(self, tokens=1):
+        delay = self.reserve(tokens)
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `reset_timeout` seconds. After that one trial call is let through (half-open);
+    success closes the circuit again, failure opens it for another timeout.
+    """
+    def __init__(self, name, failure_threshold=5, reset_timeout=60):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_timeout or self.trial_running:
+                raise CircuitOpenError(f"{self.name} circuit is open after {self.failures} failures")
+            self.trial_running = True
+
+    def record_success(self):
+        with self.lock:
+            if self.opened_at is not None:
+                logging.info(f"{self.name} circuit closed.")
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def release_trial(self):
+        """
+        Lets another trial through after one was cancelled before it could finish.
+        """
+        with self.lock:
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logging.error(f"{self.name} circuit opened after {self.failures} failures.")
+                self.opened_at = time.monotonic()
+
+
+def status_code_of(exc):
+    response = getattr(exc, 'response', None)
+    return getattr(exc, 'status_code', None) or getattr(response, 'status_code', None)
+
+
+def retry_after_seconds(exc):
+    """
+    Seconds the provider asked us to wait (Retry-After, or Bluesky's
+    RateLimit-Reset epoch), or None if the error carries no such hint.
+    """
+    headers = getattr(getattr(exc, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    headers = {str(key).lower(): value for key, value in dict(headers).items()}
+    retry_after = headers.get('retry-after')
+    if retry_after:
+        try:
+            return max(float(retry_after), 0)
+        except ValueError:
+            try:
+                return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0)
+            except (TypeError, ValueError):
+                return None
+    reset = headers.get('ratelimit-reset')
+    if reset:
+        try:
+            return max(float(reset) - time.time(), 0)
+        except ValueError:
+            return None
+    return None
+
+
+def is_retryable(exc):
+    """
+    Transient failures: rate limits, overload, 5xx, timeouts and dropped connections.
+    """
+    if isinstance(exc, CircuitOpenError):
+        return False
+    status = status_code_of(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    # openai/anthropic/httpx connection and timeout errors, without importing them here
+    name = type(exc).__name__
+    return any(part in name for part in ("Timeout", "Connection", "RateLimit", "Overloaded", "InternalServer"))
+
+
+class ProviderGuard:
+    """
+    Rate limit, retry policy and circuit breaker for one provider or endpoint.
+    Every call waits for a token, retries transient errors with jittered
+    exponential backoff (or as long as Retry-After asks, up to `max_wait`),
+    and fails fast with CircuitOpenError while the provider keeps failing.
+    """
+    def __init__(self, name, rate, capacity, attempts=4, max_wait=30, failure_threshold=5, reset_timeout=60):
+        self.name = name
+        self.bucket = TokenBucket(rate, capacity)
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self.attempts = attempts
+        self.max_wait = max_wait
+        self.backoff = wait_random_exponential(multiplier=1, max=max_wait)
+
+    def wait(self, retry_state):
+        exc = retry_state.outcome.exception()
+        retry_after = retry_after_seconds(exc)
+        if retry_after is not None:
+            # A little jitter so callers told the same time don't return together
+            return min(retry_after, self.max_wait) + random.uniform(0, 0.25 + retry_after * 0.1)
+        return self.backoff(retry_state)
+
+    def log_retry(self, retry_state):
+        exc = retry_state.outcome.exception()
+        logging.error(f"{self.name} call failed (attempt {retry_state.attempt_number}/{self.attempts}), "
+                      f"retrying in {retry_state.next_action.sleep:.1f}s: {exc}")
+
+    def retry_policy(self):
+        return dict(stop=stop_after_attempt(self.attempts), wait=self.wait,
+                    retry=retry_if_exception(is_retryable), before_sleep=self.log_retry, reraise=True)
+
+    def record(self, exc):
+        if not isinstance(exc, Exception):
+            # Cancelled (e.g. by a generation timeout): says nothing about the provider
+            self.breaker.release_trial()
+            return
+        # Only failures that say something about the provider's health count towards the breaker
+        if is_retryable(exc):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    async def call(self, fn, *args, **kwargs):
+        """
+        Awaits `fn(*args, **kwargs)` under this guard.
+        """
+        async for attempt in AsyncRetrying(**self.retry_policy()):
+            with attempt:
+                self.breaker.before_call()
+                await self.bucket.aacquire()
+                try:
+                    result = await fn(*args, **kwargs)
+                except BaseException as e:
+                    self.record(e)
+                    raise
+                self.breaker.record_success()
+        return result
+
+    def call_sync(self, fn, *args, **kwargs):
+        """
+        Calls `fn(*args, **kwargs)` under this guard, blocking while it waits.
+        """
+        for attempt in Retrying(**self.retry_policy()):
+            with attempt:
+                self.breaker.before_call()
+                self.bucket.acquire()
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as e:
+                    self.record(e)
+                    raise
+                self.breaker.record_success()
+        return result
+
+
+_guards = {}
+_guards_lock = threading.Lock()
+
+
+def get_guard(name):
+    """
+    Returns the process-wide guard for a provider/endpoint, so every story and
+    agent draws on the same limits.
+    """
+    with _guards_lock:
+        if name not in _guards:
+            rate, capacity = DEFAULT_LIMITS.get(name, DEFAULT_LIMITS["openai"])
+            _guards[name] = ProviderGuard(name, rate, capacity, **GUARD_OPTIONS.get(name, {}))
+        return _guards[name]
+
+
+async def guarded_ainvoke(name, runnable, *args, **kwargs):
+    """
+    `runnable.ainvoke(...)` under the named guard.
+    """
+    return await get_guard(name).call(runnable.ainvoke, *args, **kwargs)
+
+
+def guarded_invoke(name, runnable, *args, **kwargs):
+    """
+    `runnable.invoke(...)` under the named guard.
+    """
+    return get_guard(name).call_sync(runnable.invoke, *args, **kwargs)
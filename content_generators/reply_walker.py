@@ -0,0 +1,53 @@
+# content_generators/reply_walker.py
+
+from collections import deque
+
+
+def iter_replies(client, post_uri, max_depth=1, page_depth=None):
+    """
+    Walks the reply tree under a post without recursion and yields one dict per reply:
+    text, likes, retweets, uri, parent_uri and depth (1 = direct reply).
+
+    Each get_post_thread call asks for at most `page_depth` levels (default: all
+    of `max_depth`) and no parents. Replies at the bottom of a page that have
+    replies of their own are fetched with a follow-up call while `max_depth`
+    allows, so the payload grows with the depth we ask for, not the size of the thread.
+    """
+    page_depth = page_depth or max_depth
+    pages = deque([(post_uri, 0)])
+    while pages:
+        uri, base_depth = pages.popleft()
+        depth = min(page_depth, max_depth - base_depth)
+        response = client.get_post_thread(uri=uri, depth=depth, parent_height=0)
+        thread = response.thread
+        # Only the replies are needed from here on
+        del response
+
+        stack = [(reply, base_depth + 1, uri) for reply in reversed(getattr(thread, 'replies', None) or [])]
+        del thread
+        while stack:
+            node, node_depth, parent_uri = stack.pop()
+            post = getattr(node, 'post', None)
+            # Deleted and blocked replies have no post
+            if post is None:
+                continue
+
+            text = getattr(post.record, 'text', None)
+            if text:
+                yield {
+                    'text': text,
+                    'likes': getattr(post, 'like_count', 0) or 0,
+                    'retweets': getattr(post, 'repost_count', 0) or 0,
+                    'uri': post.uri,
+                    'parent_uri': parent_uri,
+                    'depth': node_depth,
+                }
+
+            if node_depth >= max_depth:
+                continue
+            children = getattr(node, 'replies', None)
+            if children:
+                stack.extend((child, node_depth + 1, post.uri) for child in reversed(children))
+            elif node_depth == base_depth + depth and (getattr(post, 'reply_count', 0) or 0) > 0:
+                # The page stopped here but the branch goes on
+                pages.append((post.uri, node_depth))
@@ -0,0 +1,107 @@
+# content_generators/story_context.py
+
+import re
+import tiktoken
+
+# Tokens of story context each model gets in the generation prompt.
+# The rest of the prompt (phase guidelines and instructions) is roughly 400 tokens.
+MODEL_TOKEN_BUDGETS = {
+    "gpt-4": 1200,
+    "claude-3-5-sonnet-20240620": 1200,
+}
+DEFAULT_TOKEN_BUDGET = 1200
+
+_encoding = None
+
+
+def get_encoding():
+    # Loading the BPE ranks is slow, so only do it once per process
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding
+
+
+def count_tokens(text):
+    return len(get_encoding().encode(text))
+
+
+def model_name_of(llm):
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None)
+
+
+def budget_for_models(llms):
+    """
+    The same context is sent to every provider, so it has to fit the smallest budget.
+    """
+    budgets = [MODEL_TOKEN_BUDGETS.get(model_name_of(llm), DEFAULT_TOKEN_BUDGET) for llm in llms]
+    return min(budgets) if budgets else DEFAULT_TOKEN_BUDGET
+
+
+def first_sentence(text):
+    match = re.match(r'\s*([^.!?]*[.!?])', text)
+    return match.group(1).strip() if match else text.strip()
+
+
+class StoryContextBuilder:
+    """
+    Fits the month's posts into a fixed token budget.
+    The most recent posts are always kept verbatim; older posts are kept whole
+    while they fit, then cut to their first sentence, then dropped.
+    """
+    def __init__(self, token_budget=DEFAULT_TOKEN_BUDGET, keep_recent=3):
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+
+    def build(self, posts, summary=None):
+        """
+        `posts` are ordered oldest to newest. When older posts have to be cut,
+        `summary` (the rolling story summary) stands in for them.
+        Returns the context as a single string.
+        """
+        if not posts:
+            return ""
+
+        recent = posts[-self.keep_recent:] if self.keep_recent else []
+        older = posts[:len(posts) - len(recent)]
+
+        # The whole month fits, so no summary is needed
+        total = sum(count_tokens(post) + 1 for post in posts)
+        if total <= self.token_budget:
+            return " ".join(posts)
+
+        used = sum(count_tokens(post) + 1 for post in recent)
+        if summary:
+            summary = f"Story so far: {summary}"
+            used += count_tokens(summary) + 1
+
+        # Walk backwards so the posts closest to the present survive the longest
+        kept = []
+        compressing = False
+        dropped = 0
+        for index in range(len(older) - 1, -1, -1):
+            post = older[index]
+            if not compressing:
+                cost = count_tokens(post) + 1
+                if used + cost <= self.token_budget:
+                    kept.append(post)
+                    used += cost
+                    continue
+                compressing = True
+
+            short = first_sentence(post)
+            cost = count_tokens(short) + 2
+            if used + cost <= self.token_budget:
+                kept.append(short + " …")
+                used += cost
+            else:
+                dropped = index + 1
+                break
+
+        kept.reverse()
+        parts = []
+        if summary:
+            parts.append(summary)
+        elif dropped:
+            parts.append(f"[{dropped} earlier posts omitted]")
+        return " ".join(parts + kept + recent)
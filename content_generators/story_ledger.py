@@ -0,0 +1,114 @@
+# content_generators/story_ledger.py
+
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+NEW_MONTH_MARKER = "Welcome to a new month"
+
+
+class StoryLedger:
+    """
+    Local copy of our own top-level posts, keyed by URI and month.
+    `sync` pages the author feed newest first and stops at the first URI it
+    already has, so a daily run normally reads a single small page; the story
+    itself is always served from disk.
+    """
+    def __init__(self, db_path='logs/story_ledger.sqlite3'):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Stories run their Bluesky calls in worker threads, so the connection is shared between threads
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS posts ("
+                "uri TEXT PRIMARY KEY, cid TEXT, month TEXT NOT NULL, "
+                "created_at TEXT NOT NULL, text TEXT NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS posts_month_created ON posts (month, created_at)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS posts_created ON posts (created_at)")
+
+    def has(self, uri):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM posts WHERE uri = ?", (uri,)).fetchone() is not None
+
+    def add(self, uri, cid, text, created_at=None):
+        created_at = created_at or datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO posts (uri, cid, month, created_at, text) VALUES (?, ?, ?, ?, ?)",
+                (uri, cid, created_at[:7], created_at, text)
+            )
+
+    def sync(self, client, actor, page_size=25):
+        """
+        Stores the posts made since the newest one in the ledger.
+        On an empty ledger only the current month is fetched.
+        Returns the number of new posts.
+        """
+        # A little slack so a month boundary in a different timezone is not cut off
+        month_start = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        cutoff = (month_start - timedelta(days=2)).isoformat().replace("+00:00", "Z")
+
+        new_posts = []
+        cursor = None
+        done = False
+        while not done:
+            response = client.get_author_feed(actor=actor, cursor=cursor, limit=page_size,
+                                              filter='posts_no_replies')
+            for item in response.feed:
+                post = item.post
+                if self.has(post.uri):
+                    done = True
+                    break
+                # Skip reposts and replies; only our own top-level posts make up the story
+                if item.reason is not None or item.reply is not None:
+                    continue
+                text = getattr(post.record, 'text', None)
+                created_at = getattr(post.record, 'created_at', None) or post.indexed_at
+                if created_at < cutoff:
+                    done = True
+                    break
+                if text:
+                    new_posts.append((post.uri, post.cid, text, created_at))
+            cursor = response.cursor
+            if not cursor:
+                break
+
+        for uri, cid, text, created_at in new_posts:
+            self.add(uri, cid, text, created_at)
+        logging.info(f"Story ledger synced {len(new_posts)} new posts.")
+        return len(new_posts)
+
+    def current_story(self):
+        """
+        Returns the story posts made since the latest new-month post, oldest first,
+        and the URI of the most recent one.
+        """
+        with self.lock:
+            marker = self.conn.execute(
+                "SELECT created_at FROM posts WHERE text LIKE ? ORDER BY created_at DESC LIMIT 1",
+                (NEW_MONTH_MARKER + "%",)
+            ).fetchone()
+            since = marker[0] if marker else ""
+            rows = self.conn.execute(
+                "SELECT uri, text FROM posts WHERE created_at > ? ORDER BY created_at ASC",
+                (since,)
+            ).fetchall()
+        if not rows:
+            return [], None
+        return [text for _, text in rows], rows[-1][0]
+
+    def month_posts(self, month):
+        """
+        Returns every stored post of a month ("YYYY-MM"), oldest first.
+        """
+        with self.lock:
+            rows = self.conn.execute("SELECT text FROM posts WHERE month = ? ORDER BY created_at ASC",
+                                     (month,)).fetchall()
+        return [text for (text,) in rows]
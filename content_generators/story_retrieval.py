@@ -0,0 +1,99 @@
+# content_generators/story_retrieval.py
+
+import math
+import re
+from collections import Counter, defaultdict
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from", "had", "has", "have", "he", "her",
+    "his", "i", "in", "into", "is", "it", "its", "me", "my", "no", "not", "of", "on", "or", "our", "she", "so",
+    "that", "the", "their", "them", "then", "there", "they", "this", "to", "was", "we", "were", "what", "when",
+    "which", "who", "will", "with", "you", "your",
+}
+
+
+def tokenize(text):
+    words = re.findall(r"[a-z0-9']+", (text or "").lower())
+    return [word.strip("'") for word in words if word.strip("'") and word.strip("'") not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over short documents, kept in memory. Documents are only ever
+    appended, and each append updates the postings and document frequencies
+    in place, so adding a post costs as much as its own length.
+    """
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs = []
+        self.term_freqs = []
+        self.lengths = []
+        self.total_length = 0
+        self.postings = defaultdict(list)
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, text):
+        doc_id = len(self.docs)
+        freqs = Counter(tokenize(text))
+        self.docs.append(text)
+        self.term_freqs.append(freqs)
+        self.lengths.append(sum(freqs.values()))
+        self.total_length += self.lengths[-1]
+        for term in freqs:
+            self.postings[term].append(doc_id)
+        return doc_id
+
+    def search(self, query, k=3, exclude=()):
+        """
+        The `k` best-matching documents as (doc_id, score), best first.
+        Documents in `exclude` and documents sharing no term with the query are skipped.
+        """
+        if not self.docs:
+            return []
+        average_length = self.total_length / len(self.docs) or 1
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            doc_ids = self.postings.get(term)
+            if not doc_ids:
+                continue
+            idf = math.log(1 + (len(self.docs) - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            for doc_id in doc_ids:
+                if doc_id in exclude:
+                    continue
+                freq = self.term_freqs[doc_id][term]
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / average_length)
+                scores[doc_id] += idf * freq * (self.k1 + 1) / (freq + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+class StoryRetriever:
+    """
+    BM25 index over the current month's story posts, for finding earlier beats
+    (the exposition's "breadcrumbs") worth calling back to.
+    `sync` only indexes posts it hasn't seen; a new month starts a fresh index.
+    """
+    def __init__(self):
+        self.index = BM25Index()
+
+    def sync(self, posts):
+        indexed = self.index.docs
+        if posts[:len(indexed)] != indexed:
+            self.index = BM25Index()
+            indexed = self.index.docs
+        for post in posts[len(indexed):]:
+            self.index.add(post)
+
+    def callbacks(self, posts, latest_post, user_comment=None, k=3, skip_recent=3):
+        """
+        Up to `k` earlier posts most relevant to the latest post and the chosen
+        comment, in story order. The last `skip_recent` posts are left out since
+        the prompt already has them.
+        """
+        self.sync(posts)
+        recent = set(range(max(len(posts) - skip_recent, 0), len(posts)))
+        query = f"{latest_post or ''} {user_comment or ''}"
+        hits = self.index.search(query, k=k, exclude=recent)
+        return [self.index.docs[doc_id] for doc_id, _ in sorted(hits)]
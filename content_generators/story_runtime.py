@@ -0,0 +1,135 @@
+# content_generators/story_runtime.py
+
+import asyncio
+import functools
+import json
+import os
+
+from .bluesky_comment_analysis_agent import CommentAnalysisAgent, build_comment_model
+from .bluesky_generation_agent import TweetGenerationAgent, build_generation_models, build_providers
+from .bluesky_session import BlueskySession
+from .engagement_scheduler import EngagementScheduler
+from .llm_cache import SQLiteLLMCache
+from .pregenerated_posts import PregeneratedPosts
+from .story_phase_manager import StoryPhaseManager
+
+# The original single story; used when there is no stories file
+DEFAULT_STORY = {
+    "name": "collectivelore",
+    "actor": "collectivelore.bsky.social",
+    "handle_env": "BLUESKY_HANDLE",
+    "password_env": "BLUESKY_PASSWORD",
+    "prompts": "config/phase_prompts.json",
+    "hashtag": "#CollectiveLore",
+    "data_dir": "logs",
+}
+
+# Concurrent generations per provider across every story in the process
+PROVIDER_CONCURRENCY = {"openai": 8, "anthropic": 4}
+
+
+def load_story_configs(path='config/stories.json'):
+    """
+    Reads the stories to run from `path`: {"stories": [{"name": ..., ...}, ...]}.
+    Falls back to the single default story if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return [dict(DEFAULT_STORY)]
+    with open(path, 'r', encoding='utf-8') as file:
+        try:
+            stories = json.load(file).get("stories", [])
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Error decoding JSON from {path}: {e}")
+    names = [story["name"] for story in stories]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Story names in {path} must be unique")
+    return stories
+
+
+class ProviderPool:
+    """
+    Model clients and the LLM cache shared by every story in the process.
+    Generations of all stories go through one semaphore per provider, and every
+    call through the provider's shared guard (see rate_limiter), so the stories
+    share each provider's rate limit instead of multiplying it.
+    """
+    def __init__(self, openai_api_key, anthropic_api_key, concurrency=PROVIDER_CONCURRENCY):
+        self.openai_api_key = openai_api_key
+        self.anthropic_api_key = anthropic_api_key
+        self.llm_cache = SQLiteLLMCache()
+        self.generation_models = build_generation_models(openai_api_key, anthropic_api_key, self.llm_cache)
+        self.comment_model = build_comment_model(openai_api_key, self.llm_cache)
+        self.limits = {name: asyncio.Semaphore(limit) for name, limit in concurrency.items()}
+
+    def providers(self):
+        return build_providers(self.generation_models, self.limits)
+
+
+class StoryRuntime:
+    """
+    One story and its account: Bluesky session, ledger, rolling summaries,
+    comment verdicts and engagement queue live under the story's `data_dir`,
+    while the models come from the shared ProviderPool. Agents are built on first use.
+    """
+    def __init__(self, config, pool, default_post_time="09:00"):
+        self.config = config
+        self.name = config["name"]
+        self.pool = pool
+        self.post_time = config.get("post_time", default_post_time)
+        self.hashtag = config.get("hashtag", DEFAULT_STORY["hashtag"])
+        self.prompts_path = config.get("prompts", DEFAULT_STORY["prompts"])
+        self.data_dir = config.get("data_dir") or os.path.join("logs", "stories", self.name)
+        self.phase_manager = StoryPhaseManager()
+        self.handle_env = config.get("handle_env", DEFAULT_STORY["handle_env"])
+        self.session = BlueskySession(
+            handle=os.getenv(self.handle_env),
+            password=os.getenv(config.get("password_env", DEFAULT_STORY["password_env"])),
+            session_path=os.path.join(self.data_dir, 'bluesky_session.txt')
+        )
+        self.actor = config.get("actor") or self.session.handle
+        # The job and the daemon's metrics task can both measure; only one at a time
+        self.engagement_lock = asyncio.Lock()
+
+    def __repr__(self):
+        return f"StoryRuntime({self.name!r})"
+
+    @functools.cached_property
+    def client(self):
+        # Without this a story would silently fall back to the default account
+        if not os.getenv(self.handle_env) and self.handle_env != DEFAULT_STORY["handle_env"]:
+            raise ValueError(f"Story {self.name}: {self.handle_env} is not set")
+        return self.session.get_client()
+
+    async def prepare(self):
+        """
+        Logs in (or resumes the stored session) in a worker thread, so stories
+        starting together don't block each other. A failed login raises and is
+        not cached, so the next job logs in again.
+        """
+        await asyncio.to_thread(lambda: self.client)
+
+    @functools.cached_property
+    def tweet_agent(self):
+        return TweetGenerationAgent(
+            self.pool.openai_api_key, self.pool.anthropic_api_key,
+            config_path=self.prompts_path,
+            providers=self.pool.providers(),
+            models=self.pool.generation_models,
+            client=self.client,
+            actor=self.actor,
+            data_dir=self.data_dir,
+            phase_manager=self.phase_manager
+        )
+
+    @functools.cached_property
+    def comment_agent(self):
+        return CommentAnalysisAgent(self.pool.openai_api_key, llm=self.pool.comment_model, client=self.client,
+                                    data_dir=self.data_dir)
+
+    @functools.cached_property
+    def engagement_scheduler(self):
+        return EngagementScheduler(self.client, queue_path=os.path.join(self.data_dir, 'engagement_queue.json'))
+
+    @functools.cached_property
+    def pregenerated(self):
+        return PregeneratedPosts(os.path.join(self.data_dir, 'pregenerated.json'))
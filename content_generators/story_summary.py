@@ -1,23 +1,106 @@
 # content_generators/story_summary.py
 
-import csv
-
-def generate_story_summary(all_posts):
-    try:
-        with open(log_file, 'r', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            tweets = [row[1] for row in reader if len(row) > 1]  # Ensure tweet content exists
-        # Create a brief summary (e.g., first two and last two tweets)
-        if len(tweets) >= 4:
-            summary = " ".join(tweets[:2] + tweets[-2:])
-        elif len(tweets) >= 2:
-            summary = " ".join(tweets)
-        else:
-            summary = "an amazing journey filled with unexpected twists and turns."
-        # Truncate if too long
-        if len(summary) > 200:
-            summary = summary[:197] + "..."
+import json
+import logging
+import os
+from datetime import datetime
+
+DEFAULT_SUMMARY = "an amazing journey filled with unexpected twists and turns."
+
+
+def current_month_key():
+    return datetime.now().strftime("%Y-%m")
+
+
+class RollingStorySummary:
+    """
+    Keeps a rolling summary of each month's story on disk.
+    Every update folds only the posts made since the last update into the
+    stored summary, so reading the summary never touches the month's posts.
+    """
+    def __init__(self, llm=None, summary_dir='logs/story_summaries', max_words=120, guard=None):
+        self.llm = llm
+        self.summary_dir = summary_dir
+        self.max_words = max_words
+        # Optional ProviderGuard the summarizer's calls go through
+        self.guard = guard
+
+    def path_for(self, month_key):
+        return os.path.join(self.summary_dir, f"{month_key}.json")
+
+    def load(self, month_key=None):
+        path = self.path_for(month_key or current_month_key())
+        if not os.path.exists(path):
+            return {"summary": "", "post_count": 0, "last_post": ""}
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error(f"Error reading story summary {path}: {e}")
+            return {"summary": "", "post_count": 0, "last_post": ""}
+
+    def save(self, state, month_key=None):
+        os.makedirs(self.summary_dir, exist_ok=True)
+        path = self.path_for(month_key or current_month_key())
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(state, file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def get_summary(self, month_key=None):
+        return self.load(month_key)["summary"]
+
+    async def update(self, posts, month_key=None):
+        """
+        Folds the posts not yet covered by the stored summary into it.
+        `posts` are the month's story posts ordered oldest to newest.
+        """
+        state = self.load(month_key)
+        count = state["post_count"]
+
+        # If the stored position no longer lines up with the feed, start the month over
+        if count > len(posts) or (count and posts[count - 1] != state["last_post"]):
+            logging.error("Story summary is out of sync with the feed. Rebuilding it.")
+            state = {"summary": "", "post_count": 0, "last_post": ""}
+            count = 0
+
+        new_posts = posts[count:]
+        if not new_posts:
+            return state["summary"]
+
+        try:
+            summary = await self.fold(state["summary"], new_posts)
+        except Exception as e:
+            # Leave the state untouched so the segment is folded in on the next run
+            logging.error(f"Error updating story summary: {e}")
+            return state["summary"]
+
+        state = {"summary": summary, "post_count": len(posts), "last_post": posts[-1]}
+        self.save(state, month_key)
         return summary
-    except Exception as e:
-        print(f"Error generating summary: {e}")
-        return "an amazing journey filled with unexpected twists and turns."
+
+    async def fold(self, summary, new_posts):
+        segment = " ".join(new_posts)
+        if self.llm is None:
+            # Without a model, keep the most recent words of the story as its summary
+            words = " ".join(filter(None, [summary, segment])).split()
+            return " ".join(words[-self.max_words:])
+
+        prompt = (
+            f"Here is the summary of a serialized story so far:\n\"{summary or 'The story has just begun.'}\"\n\n"
+            f"Here are the newest posts of the story:\n\"{segment}\"\n\n"
+            f"Rewrite the summary so it also covers the newest posts. Keep the main characters, settings, "
+            f"open conflicts and any details that may matter later. Use at most {self.max_words} words "
+            f"and respond with the summary only."
+        )
+        messages = [{"role": "user", "content": prompt}]
+        if self.guard:
+            response = await self.guard.call(self.llm.ainvoke, messages)
+        else:
+            response = await self.llm.ainvoke(messages)
+        return response.content.strip()
+
+
+def generate_story_summary(month_key=None, summary_dir='logs/story_summaries'):
+    summary = RollingStorySummary(summary_dir=summary_dir).get_summary(month_key)
+    return summary or DEFAULT_SUMMARY
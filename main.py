@@ -1,8 +1,7 @@
 # main.py
 
 import tweepy
-import schedule
-import time
+import asyncio
 import os
 import csv
 from dotenv import load_dotenv
@@ -12,6 +11,7 @@ from content_generators.tweet_generation_agent import TweetGenerationAgent
 from content_generators.comment_analysis_agent import CommentAnalysisAgent
 from content_generators.story_phase_manager import StoryPhaseManager
 from content_generators.story_summary import generate_story_summary
+from content_generators.daemon import DailyDaemon
 
 # Load environment variables
 load_dotenv()
@@ -161,6 +161,7 @@ def job():
                 next_tweet = tweet_agent.generate_tweet(last_tweet=last_tweet_content, user_comment=None)
                 tweets_to_post.append(next_tweet)
 
+    posted_tweets = []
     for tweet in tweets_to_post:
         # Ensure the tweet is safe
         safe = is_content_safe(tweet)
@@ -173,22 +174,27 @@ def job():
             status = twitter_client.update_status(tweet)
             tweet_id = status.id
             print(f"Posted tweet with ID {tweet_id}")
+            posted_tweets.append((tweet_id, tweet))
         except Exception as e:
             print(f"Error posting tweet: {e}")
             continue
 
-        # Wait for engagement to accumulate
-        time.sleep(3600)  # Wait for 1 hour
+    # Returned so the daemon can measure their engagement once it has had an hour to accumulate
+    return posted_tweets
 
-        # Fetch updated tweet data
-        try:
-            tweet_data = twitter_client.get_status(tweet_id, tweet_mode='extended')
-            likes = tweet_data.favorite_count
-            retweets = tweet_data.retweet_count
-            comments_fetched = fetch_comments(tweet_id)
-        except Exception as e:
-            print(f"Error fetching tweet metrics: {e}")
-            likes, retweets, comments_fetched = 0, 0, 0
+def measure_tweets(posted_tweets):
+    # Fetch updated tweet data for every posted tweet in one lookup
+    try:
+        statuses = {status.id: status for status in twitter_client.lookup_statuses([tweet_id for tweet_id, _ in posted_tweets])}
+    except Exception as e:
+        print(f"Error fetching tweet metrics: {e}")
+        statuses = {}
+
+    for tweet_id, tweet in posted_tweets:
+        tweet_data = statuses.get(tweet_id)
+        likes = tweet_data.favorite_count if tweet_data else 0
+        retweets = tweet_data.retweet_count if tweet_data else 0
+        comments_fetched = fetch_comments(tweet_id)
 
         # Calculate reward
         reward = calculate_reward(likes, retweets, len(comments_fetched))
@@ -200,11 +206,24 @@ def job():
         # Update top examples if necessary
         update_top_examples(tweet, reward)
 
-# Schedule the job every day at 09:00 AM
-schedule.every().day.at("17:04").do(job)
+# Engagement measurements waiting for their hour; kept so the tasks aren't garbage collected
+measurement_tasks = set()
+
+async def measure_later(posted_tweets):
+    # Sleeps on the daemon, so a shutdown ends the wait instead of holding the process for an hour
+    if not await daemon.sleep(3600):
+        await asyncio.to_thread(measure_tweets, posted_tweets)
+
+async def daily_job():
+    posted_tweets = await asyncio.to_thread(job)
+    if posted_tweets:
+        task = asyncio.create_task(measure_later(posted_tweets))
+        measurement_tasks.add(task)
+        task.add_done_callback(measurement_tasks.discard)
+
+# Run the job every day at 5:00 PM on one resident event loop instead of polling every minute
+daemon = DailyDaemon(daily_job, post_time="17:04")
 
 print("Storyline bot is running and will post daily tweets at 5:00 PM.")
 
-while True:
-    schedule.run_pending()
-    time.sleep(60)  # Wait one minute
+asyncio.run(daemon.run())
@@ -0,0 +1,102 @@
+# startup_benchmark.py
+# Measures cold start of the bot entry points in a fresh interpreter:
+#   - import: time to import the entry point module
+#   - first request: time from interpreter start to the job's first network call
+# Exits with status 1 if either goes over its limit, so it can guard against regressions.
+#
+#   python startup_benchmark.py [--max-import 1.0] [--max-first-request 2.0] [--runs 3]
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Runs inside the child interpreter. The first DNS lookup or socket connect records
+# the time and aborts the job with a BaseException, which the job's `except Exception`
+# handlers don't swallow.
+CHILD = r'''
+import asyncio, json, socket, sys, time
+start = time.perf_counter()
+
+class FirstRequest(BaseException):
+    pass
+
+first_request = {}
+
+def trap(*args, **kwargs):
+    first_request.setdefault("seconds", time.perf_counter() - start)
+    raise FirstRequest()
+
+socket.getaddrinfo = trap
+socket.socket.connect = trap
+socket.create_connection = trap
+
+module = __import__(sys.argv[1])
+import_seconds = time.perf_counter() - start
+
+try:
+    asyncio.run(module.job(dry_run=True))
+except FirstRequest:
+    pass
+except Exception as e:
+    first_request.setdefault("error", repr(e))
+
+print(json.dumps({"import": import_seconds, "first_request": first_request.get("seconds"),
+                  "error": first_request.get("error")}))
+'''
+
+ENTRY_POINTS = ["bluesky_main", "bluesky_check"]
+
+
+def measure(module, runs):
+    env = dict(os.environ)
+    # Model clients refuse to build without keys; the benchmark never reaches the network anyway
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    env.setdefault("ANTHROPIC_API_KEY", "sk-ant-benchmark")
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", CHILD, module], capture_output=True, text=True,
+                                env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+        lines = output.stdout.strip().splitlines()
+        if output.returncode != 0 or not lines:
+            raise RuntimeError(f"{module} failed to start:\n{output.stderr}")
+        results.append(json.loads(lines[-1]))
+    # Best of N filters out noise from a cold disk cache
+    best_import = min(result["import"] for result in results)
+    first_requests = [result["first_request"] for result in results if result["first_request"] is not None]
+    return {
+        "import": best_import,
+        "first_request": min(first_requests) if first_requests else None,
+        "error": next((result["error"] for result in results if result["error"]), None),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start benchmark for the bot entry points.")
+    parser.add_argument("--max-import", type=float, default=1.0, help="Import time limit in seconds.")
+    parser.add_argument("--max-first-request", type=float, default=2.0, help="Time-to-first-request limit in seconds.")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    failed = False
+    for module in ENTRY_POINTS:
+        result = measure(module, args.runs)
+        first_request = result["first_request"]
+        print(f"{module}: import {result['import'] * 1000:.0f} ms, first request "
+              + (f"{first_request * 1000:.0f} ms" if first_request is not None else "never made"))
+        if result["error"]:
+            print(f"  FAILED: job stopped before any request: {result['error']}")
+            failed = True
+        if result["import"] > args.max_import:
+            print(f"  REGRESSION: import is over {args.max_import:.2f}s")
+            failed = True
+        if first_request is not None and first_request > args.max_first_request:
+            print(f"  REGRESSION: first request is over {args.max_first_request:.2f}s")
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()